@@ -1,46 +1,147 @@
 # Standard lib
-from datetime import datetime, timezone, timedelta
-from uuid import uuid4
+import hashlib
+from datetime import datetime, timezone
+from uuid import UUID
 import logging
+import time
 
 # Third-party
-from fastapi import APIRouter, Depends, HTTPException, status, Body, Response, Request
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Body, Response
+from fastapi.responses import ORJSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.ext.asyncio import AsyncSession
-from jose import JWTError, jwt
-from jose.exceptions import ExpiredSignatureError
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+import jwt
 from sqlalchemy.future import select
-from sqlalchemy import delete
+from sqlalchemy import delete, exists, func, update
 
 # Local
-from app.core.config import get_settings
-from app.core.metrics import user_login_counter, user_registration_counter, refresh_token_usage_counter, admin_action_counter
-from app.core.security import verify_password, create_access_token, create_refresh_token
-from app.db.session import get_db
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.metrics import (
+    password_login_counter,
+    password_registration_counter,
+    refresh_rotation_counter,
+    admin_dashboard_access_counter,
+)
+from app.core.security import (
+    verify_password_async,
+    create_access_token,
+    create_refresh_token,
+    decode_token,
+    new_jti as generate_jti,
+    peek_unverified_claims,
+)
+from app.db.session import get_db, get_sessionmaker
 from app.dependencies.auth import get_current_user, require_role
 from app.models.user import User
 from app.schemas.user import UserCreatePublic as UserCreate, UserOut, Token
 from app.services import auth as auth_service
-from app.services.auth import create_user, get_user_by_email
+from app.services.auth import (
+    create_user,
+    get_user_credentials_by_email,
+    invalidate_cached_user,
+    invalidate_user_credentials,
+)
 from app.services.refresh_tokens import (
-    create_refresh_token as save_refresh_token,
-    deactivate_refresh_token,
-    is_refresh_token_valid,
+    persist_refresh_token,
+    rotate_refresh_token,
+    get_user_refresh_state,
     get_all_valid_refresh_tokens_for_user,
-    get_refresh_token_from_db,
 )
-from app.limiter import limiter
+from app.limiter import TokenBucketLimiter
 from app.schemas.enums import UserRole
 
-settings = get_settings()
-router = APIRouter()
+# Set on the router as well as the app so these routes keep orjson wherever they are mounted
+router = APIRouter(default_response_class=ORJSONResponse)
 logger = logging.getLogger(__name__)
 
+# Verified refresh token payloads keyed by sha256(token). Reuse and revocation are
+# still enforced against the database on every call; this only skips re-verification.
+_refresh_payload_cache = TTLCache(maxsize=10000, ttl=30)
+
+# Cookie attributes derived from settings, resolved once at import
+_SECURE_COOKIE = settings.env == "production"
+_ACCESS_MAX_AGE = settings.access_token_expire_seconds
+_REFRESH_MAX_AGE = settings.refresh_token_expire_seconds
+_REFRESH_COOKIE_PATH = "/api/auth/api/v1/refresh"
+
+
+def _cookie_template(name: str, max_age: int, path: str, secure: bool) -> bytes:
+    """Build a Set-Cookie header value with a %s placeholder for the cookie value."""
+    template = f"{name}=%s; HttpOnly; Max-Age={max_age}; Path={path}; SameSite=lax"
+    if secure:
+        template += "; Secure"
+    return template.encode("latin-1")
+
+
+# Set-Cookie headers for the token pair, keyed by the Secure flag. Only the token is
+# substituted per request; JWTs are base64url and dots, so they need no quoting.
+_TOKEN_COOKIE_TEMPLATES = {
+    secure: (
+        _cookie_template("access_token", _ACCESS_MAX_AGE, "/", secure),
+        _cookie_template("refresh_token", _REFRESH_MAX_AGE, _REFRESH_COOKIE_PATH, secure),
+    )
+    for secure in (False, True)
+}
+
+
+def _set_token_cookies(
+    response: Response, access_token: str, refresh_token: str, secure: bool
+) -> None:
+    """Append the access and refresh token cookies to response."""
+    access_template, refresh_template = _TOKEN_COOKIE_TEMPLATES[secure]
+    response.raw_headers.append((b"set-cookie", access_template % access_token.encode("ascii")))
+    response.raw_headers.append((b"set-cookie", refresh_template % refresh_token.encode("ascii")))
+
+
+# Built once; used to serialize the admin user listing in a single pass
+_USER_LIST_ADAPTER = TypeAdapter(list[UserOut])
+
+
+def _user_response(user) -> Response:
+    """
+    Serialize a user (ORM instance or row) as a UserOut JSON response.
+
+    Returning a Response skips FastAPI's response_model handling, which would dump the
+    model to a dict and validate it a second time; response_model still documents it.
+    """
+    return Response(UserOut.model_validate(user).model_dump_json(), media_type="application/json")
+
 
-@router.post("/users/", response_model=UserOut, tags=["auth"])
-@limiter.limit("40/minute")  # 40 registrations per minute per IP
+# Per-IP rate limits
+_register_limit = TokenBucketLimiter(capacity=40, period=60)  # 40 registrations per minute
+_login_limit = TokenBucketLimiter(capacity=40, period=60)  # 40 login attempts per minute
+_refresh_limit = TokenBucketLimiter(capacity=100, period=60)  # 100 refreshes per minute
+
+_BOARDTEST_EMAIL_SUFFIX = "@boardtests.com"
+
+# Roles an admin may assign, by value; guest is deliberately not assignable
+_ASSIGNABLE_ROLES = {r.value: r for r in (UserRole.user, UserRole.admin)}
+
+
+def _decode_refresh_token(token: str) -> dict:
+    """
+    Verify and decode a refresh token, caching the payload until min(30s, exp).
+
+    The returned payload is shared between callers and must not be mutated.
+
+    Raises:
+        jwt.ExpiredSignatureError: If the token has expired.
+        jwt.InvalidTokenError: If the token is otherwise invalid.
+    """
+    key = hashlib.sha256(token.encode("utf-8")).digest()
+    payload = _refresh_payload_cache.get(key)
+    if payload is None:
+        payload = decode_token(token)
+        remaining = payload.get("exp", 0) - time.time()
+        if remaining > 0:
+            _refresh_payload_cache.set(key, payload, ttl=min(_refresh_payload_cache.ttl, remaining))
+    return payload
+
+
+@router.post("/users/", response_model=UserOut, tags=["auth"], dependencies=[Depends(_register_limit)])
 async def register_user(
-    request: Request,
     user_create: UserCreate,
     db: AsyncSession = Depends(get_db),
 ):
@@ -54,104 +155,101 @@ async def register_user(
     Returns:
         UserOut: The created user.
     """
-    logger.debug(f"Registering user with email: {user_create.email}")
-    existing_user = await get_user_by_email(db, user_create.email)
-    if existing_user:
-        logger.warning(f"Registration failed - email already registered: {user_create.email}")
-        raise HTTPException(status_code=400, detail="Email already registered")
+    logger.debug("Registering user with email: %s", user_create.email)
     user = await create_user(db, user_create)
-    user_registration_counter.labels(method="password").inc()
-    logger.info(f"User registered successfully: {user.email} (ID: {user.id})")
-    return user
+    if user is None:
+        logger.warning("Registration failed - email already registered: %s", user_create.email)
+        raise HTTPException(status_code=400, detail="Email already registered")
+    password_registration_counter.inc()
+    logger.info("User registered successfully: %s (ID: %s)", user.email, user.id)
+    return _user_response(user)
 
 
-@router.post("/token", response_model=Token, tags=["auth"])
-@limiter.limit("40/minute")  # 40 login attempts per minute per IP
+@router.post("/token", response_model=Token, tags=["auth"], dependencies=[Depends(_login_limit)])
 async def login_user(
-    request: Request,
-    response: Response,
+    background_tasks: BackgroundTasks,
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: AsyncSession = Depends(get_db),
-) -> Token:
+    session_factory: async_sessionmaker[AsyncSession] = Depends(get_sessionmaker),
+) -> ORJSONResponse:
     """
     Authenticate a user and return access and refresh tokens.
 
     Args:
+        background_tasks (BackgroundTasks): Runs the refresh token bookkeeping after the response.
         form_data (OAuth2PasswordRequestForm): The login form data.
         db (AsyncSession): The database session.
+        session_factory (async_sessionmaker[AsyncSession]): Session factory for the background task.
 
     Returns:
-        Token: The access and refresh tokens.
+        ORJSONResponse: The access and refresh tokens (Token shape), with cookies set.
     """
-    logger.debug(f"Login attempt for email: {form_data.username}")
-    user: User | None = await get_user_by_email(db, form_data.username)
+    logger.debug("Login attempt for email: %s", form_data.username)
+    credentials = await get_user_credentials_by_email(db, form_data.username)
 
-    if not user or not verify_password(form_data.password, user.hashed_password):
-        logger.warning(f"Failed login attempt for email: {form_data.username}")
+    # bcrypt is CPU-bound; run it on the bcrypt pool so it doesn't block the event loop
+    if not credentials or not await verify_password_async(form_data.password, credentials[1]):
+        logger.warning("Failed login attempt for email: %s", form_data.username)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    # Successful login
-    user_login_counter.labels(method="password").inc()
+    user_id = credentials[0]
+    now = int(time.time())
+    jti = generate_jti()
+
+    # Record the new JTI; RETURNING reads the current role and confirms the
+    # (possibly cached) user still exists
+    result = await db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(last_refresh_jti=jti)
+        .returning(User.email, User.role)
+    )
+    row = result.first()
+    if row is None:
+        invalidate_user_credentials(form_data.username)
+        logger.warning("Failed login attempt for email: %s", form_data.username)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect email or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
 
-    now = datetime.now(timezone.utc)
-    access_exp_delta = timedelta(minutes=settings.access_token_expire_minutes)
-    refresh_exp_delta = timedelta(minutes=settings.refresh_token_expire_minutes)
-    jti = str(uuid4())
+    # Successful login
+    password_login_counter.inc()
 
-    access_token = create_access_token(
-        data={"sub": str(user.id), "role": user.role},
-        expires_delta=access_exp_delta,
-    )
+    access_token = create_access_token(data={"sub": str(user_id), "role": row.role}, now=now)
     refresh_token = create_refresh_token(
         data={
-            "sub": str(user.id),
-            "iat": int(now.timestamp()),
-            "jti": jti,
+            "sub": str(user_id),
+            "iat": now,
+            "jti": jti.hex,
         },
-        expires_delta=refresh_exp_delta,
     )
 
-    await db.refresh(user)
-    user.last_refresh_jti = jti
-    db.add(user)
     await db.commit()
 
-    refresh_exp = now + refresh_exp_delta
-    await save_refresh_token(db, jti, user.id, refresh_exp)
-    await db.commit()
-
-    logger.info(f"User logged in successfully: {user.email} (ID: {user.id}), JTI: {jti}")
-
-    # Set cookies
-    response.set_cookie(
-        key="access_token",
-        value=access_token,
-        httponly=True,
-        secure=settings.env == "production",
-        samesite="lax",
-        max_age=int(settings.access_token_expire_minutes * 60),
-        path="/",
-    )
-    response.set_cookie(
-        key="refresh_token",
-        value=refresh_token,
-        httponly=True,
-        secure=settings.env == "production",
-        samesite="lax",
-        max_age=int(settings.refresh_token_expire_minutes * 60),
-        path="/api/auth/api/v1/refresh",  # restrict path if you want
+    # users.last_refresh_jti (committed above) is what /refresh checks; the token record
+    # is only bookkeeping, so write it after the response instead of before it
+    refresh_exp = datetime.fromtimestamp(
+        now + _REFRESH_MAX_AGE, tz=timezone.utc
     )
+    background_tasks.add_task(persist_refresh_token, session_factory, jti, user_id, refresh_exp)
+
+    logger.info("User logged in successfully: %s (ID: %s), JTI: %s", row.email, user_id, jti)
 
-    return Token(
-        access_token=access_token,
-        refresh_token=refresh_token,
-        token_type="bearer",
+    # The tokens were just minted, so skip Token validation and serialize the dict directly
+    response = ORJSONResponse(
+        {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
     )
 
+    _set_token_cookies(response, access_token, refresh_token, _SECURE_COOKIE)
+
+    return response
+
 
 @router.get("/me", response_model=UserOut, tags=["auth"])
 async def read_current_user(current_user: User = Depends(get_current_user)):
@@ -164,18 +262,15 @@ async def read_current_user(current_user: User = Depends(get_current_user)):
     Returns:
         UserOut: The current user's data.
     """
-    logger.debug(f"Fetching current user data for user id: {current_user.id}")
-    return current_user
+    logger.debug("Fetching current user data for user id: %s", current_user.id)
+    return _user_response(current_user)
 
 
-@router.post("/refresh", response_model=Token, tags=["auth"])
-@limiter.limit("100/minute")  # 100 refreshes per minute per IP
+@router.post("/refresh", response_model=Token, tags=["auth"], dependencies=[Depends(_refresh_limit)])
 async def refresh_access_token(
-    request: Request,
-    response: Response,
     refresh_token: str = Body(..., embed=True),
     db: AsyncSession = Depends(get_db),
-) -> Token:
+) -> ORJSONResponse:
     """
     Rotate and return new access and refresh tokens using a valid refresh token.
 
@@ -184,119 +279,102 @@ async def refresh_access_token(
         db (AsyncSession): The database session.
 
     Returns:
-        Token: The new access and refresh tokens.
+        ORJSONResponse: The new access and refresh tokens (Token shape), with cookies set.
 
     Raises:
         HTTPException: If the refresh token is invalid, expired, or reused.
     """
     logger.debug("Refresh token endpoint called")
+
+    # Reject structurally malformed tokens before the HMAC check. The peeked claims are
+    # unverified and only used for this shape check; the decoded payload is re-checked below.
+    claims = peek_unverified_claims(refresh_token)
+    if (
+        claims is None
+        or not isinstance(claims.get("sub"), str)
+        or not claims["sub"].isdigit()
+        or not isinstance(claims.get("jti"), str)
+        or type(claims.get("iat")) is not int
+    ):
+        logger.error("Malformed refresh token rejected before signature verification")
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+
     try:
-        payload = jwt.decode(
-            refresh_token,
-            settings.secret_key,
-            algorithms=[settings.algorithm],
-        )
+        payload = _decode_refresh_token(refresh_token)
         sub = payload.get("sub")
-        jti = payload.get("jti")
+        jti_claim = payload.get("jti")
 
-        logger.debug(f"Decoded refresh token payload: sub={sub}, jti={jti}")
+        logger.debug("Decoded refresh token payload: sub=%s, jti=%s", sub, jti_claim)
 
         if not isinstance(sub, str) or not sub.isdigit():
             logger.error("Invalid 'sub' claim in refresh token")
             raise HTTPException(status_code=401, detail="Invalid token payload")
 
-        if not isinstance(jti, str):
+        try:
+            # Accepts both the hex form and the hyphenated form issued by older tokens
+            jti = UUID(jti_claim)
+        except (TypeError, ValueError, AttributeError):
             logger.error("Invalid 'jti' claim in refresh token")
             raise HTTPException(status_code=401, detail="Invalid refresh token")
 
         user_id = int(sub)
-        user = await db.get(User, user_id)
-        if user is None:
-            logger.error(f"User ID {user_id} from token no longer exists")
+        row = await get_user_refresh_state(db, user_id)
+        if row is None:
+            logger.error("User ID %s from token no longer exists", user_id)
             raise HTTPException(status_code=401, detail="User no longer exists")
 
-        await db.refresh(user)
-
-        if user.last_refresh_jti != jti:
-            logger.warning(f"Refresh token reuse detected for user ID {user_id}: token JTI {jti} does not match last_refresh_jti {user.last_refresh_jti}")
-            await auth_service.revoke_refresh_token(db, user, jti=jti, clear_jti=False)
+        if row.last_refresh_jti != jti:
+            logger.warning(
+                "Refresh token reuse detected for user ID %s: token JTI %s does not match last_refresh_jti %s",
+                user_id, jti, row.last_refresh_jti,
+            )
+            await auth_service.revoke_refresh_token(db, user_id, jti=jti, clear_jti=False)
             raise HTTPException(status_code=401, detail="Refresh token invalid or reused")
 
-        valid_in_db = await is_refresh_token_valid(db, jti)
-        if not valid_in_db:
-            logger.warning(f"Refresh token JTI {jti} is not valid or expired in DB for user ID {user_id}")
-            await auth_service.revoke_refresh_token(db, user, jti=jti, clear_jti=False)
-            raise HTTPException(status_code=401, detail="Refresh token invalid or reused")
-
-        now = datetime.now(timezone.utc)
-        new_jti = str(uuid4())
+        now = int(time.time())
+        new_jti = generate_jti()
 
-        access_token = create_access_token(
-            data={"sub": str(user_id), "role": user.role},
-            expires_delta=timedelta(minutes=settings.access_token_expire_minutes),
-        )
+        access_token = create_access_token(data={"sub": str(user_id), "role": row.role}, now=now)
         new_refresh_token = create_refresh_token(
             data={
                 "sub": str(user_id),
-                "iat": int(now.timestamp()),
-                "jti": new_jti,
+                "iat": now,
+                "jti": new_jti.hex,
             },
-            expires_delta=timedelta(minutes=settings.refresh_token_expire_minutes),
         )
 
-        await deactivate_refresh_token(db, jti)
-        await db.commit()
+        new_refresh_exp = datetime.fromtimestamp(
+            now + _REFRESH_MAX_AGE, tz=timezone.utc
+        )
+        logger.debug("Saving new refresh token JTI: %s for user ID %s", new_jti, user_id)
 
-        new_refresh_exp = now + timedelta(minutes=settings.refresh_token_expire_minutes)
-        logger.debug(f"Saving new refresh token JTI: {new_jti} for user ID {user_id}")
+        # Deactivate the old token, persist the new one and record its JTI in one
+        # statement. If a concurrent refresh already consumed this token, nothing changes.
+        if not await rotate_refresh_token(db, user_id, jti, new_jti, new_refresh_exp):
+            logger.warning("Refresh token JTI %s was already used for user ID %s", jti, user_id)
+            await auth_service.revoke_refresh_token(db, user_id, jti=jti, clear_jti=False)
+            raise HTTPException(status_code=401, detail="Refresh token invalid or reused")
+        await db.commit()
 
-        user.last_refresh_jti = new_jti
-        db.add(user)
-        await save_refresh_token(db, new_jti, user.id, new_refresh_exp)
-        await db.flush()
+        # Diagnostic only: costs an extra query, so skip it unless DEBUG is enabled
+        if logger.isEnabledFor(logging.DEBUG):
+            tokens_after = await get_all_valid_refresh_tokens_for_user(db, user_id)
+            logger.debug("[POST] Valid refresh tokens for user %s: %s", user_id, [t.jti for t in tokens_after])
 
-        tokens_mid = await get_all_valid_refresh_tokens_for_user(db, user.id)
-        logger.debug(f"[MID] Valid refresh tokens for user {user.id}: {[t.jti for t in tokens_mid]}")
+        logger.info("Refresh token rotated successfully for user ID %s, new JTI: %s", user_id, new_jti)
+        refresh_rotation_counter.inc()
 
-        await db.commit()
-        await db.refresh(user)
-        logger.debug(f"DB refresh complete for user ID {user_id}")
-
-        tokens_after = await get_all_valid_refresh_tokens_for_user(db, user.id)
-        logger.debug(f"[POST] Valid refresh tokens for user {user.id}: {[t.jti for t in tokens_after]}")
-
-        logger.info(f"Refresh token rotated successfully for user ID {user_id}, new JTI: {new_jti}")
-        refresh_token_usage_counter.labels(method="refresh").inc()
-
-        # Set cookies for new tokens
-        response.set_cookie(
-            key="access_token",
-            value=access_token,
-            httponly=True,
-            secure=True,
-            samesite="lax",
-            max_age=int(settings.access_token_expire_minutes * 60),
-            path="/",
-        )
-        response.set_cookie(
-            key="refresh_token",
-            value=new_refresh_token,
-            httponly=True,
-            secure=True,
-            samesite="lax",
-            max_age=int(settings.refresh_token_expire_minutes * 60),
-            path="/api/auth/api/v1/refresh",
+        response = ORJSONResponse(
+            {"access_token": access_token, "refresh_token": new_refresh_token, "token_type": "bearer"}
         )
 
-        return Token(
-            access_token=access_token,
-            refresh_token=new_refresh_token,
-            token_type="bearer",
-        )
-    except ExpiredSignatureError:
+        _set_token_cookies(response, access_token, new_refresh_token, secure=True)
+
+        return response
+    except jwt.ExpiredSignatureError:
         logger.warning("Refresh token expired")
         raise HTTPException(status_code=401, detail="Refresh token expired")
-    except JWTError:
+    except jwt.InvalidTokenError:
         logger.error("Invalid refresh token encountered during decode")
         raise HTTPException(status_code=401, detail="Invalid refresh token")
 
@@ -317,13 +395,13 @@ async def logout_user(
     Returns:
         Response: 204 No Content on success.
     """
-    logger.info(f"Logging out user ID {current_user.id}, email {current_user.email}")
-    await auth_service.revoke_refresh_token(db, current_user)
-    logger.info(f"User ID {current_user.id} logged out successfully")
+    logger.info("Logging out user ID %s, email %s", current_user.id, current_user.email)
+    await auth_service.revoke_refresh_token(db, current_user.id)
+    logger.info("User ID %s logged out successfully", current_user.id)
 
     # Clear cookies
     response.delete_cookie("access_token", path="/")
-    response.delete_cookie("refresh_token", path="/api/auth/api/v1/refresh")
+    response.delete_cookie("refresh_token", path=_REFRESH_COOKIE_PATH)
     response.status_code = status.HTTP_204_NO_CONTENT
     return response
 
@@ -339,8 +417,8 @@ async def admin_dashboard(user: User = Depends(require_role("admin"))):
     Returns:
         dict: A welcome message for the admin.
     """
-    admin_action_counter.labels(action="dashboard_access").inc()
-    logger.debug(f"Admin access by user ID {user.id}, email {user.email}")
+    admin_dashboard_access_counter.inc()
+    logger.debug("Admin access by user ID %s, email %s", user.id, user.email)
     return {"message": f"Welcome, admin {user.email}"}
 
 
@@ -359,9 +437,18 @@ async def list_all_users(
     Returns:
         List[UserOut]: All users in the system.
     """
-    result = await db.execute(select(User))
-    users = result.scalars().all()
-    return [UserOut.model_validate(u) for u in users]
+    # Stream only the columns UserOut needs, so no ORM instances are built and
+    # at most one partition of rows is buffered at a time
+    result = await db.stream(
+        select(User.id, User.email, User.role, User.created_at)
+        .execution_options(yield_per=500)
+    )
+    users = [
+        UserOut.model_validate(row)
+        async for partition in result.partitions()
+        for row in partition
+    ]
+    return Response(_USER_LIST_ADAPTER.dump_json(users), media_type="application/json")
 
 
 @router.delete("/admin/delete-boardtest-users", tags=["admin"])
@@ -372,9 +459,17 @@ async def delete_boardtest_users(
     """
     Delete all users with emails ending in '@boardtests.com' (admin only).
     """
-    stmt = delete(User).where(User.email.like('%@boardtests.com'))
+    # Suffix match as a prefix LIKE on reverse(email), so ix_users_email_reversed is used;
+    # nothing is loaded into the session, so there is nothing to synchronize
+    stmt = (
+        delete(User)
+        .where(func.reverse(User.email).like(_BOARDTEST_EMAIL_SUFFIX[::-1] + "%"))
+        .execution_options(synchronize_session=False)
+    )
     await db.execute(stmt)
     await db.commit()
+    invalidate_user_credentials()
+    invalidate_cached_user()
     logger.info("Admin deleted all @boardtests.com users")
     return {"message": "All @boardtests.com users deleted"}
 
@@ -401,22 +496,30 @@ async def update_user_role(
     Raises:
         HTTPException: If the user is not found or if there is an error during the update.
     """
-    logger.debug(f"Admin {admin_user.email} updating role for user ID {user_id} to {role}")
-    user = await db.get(User, user_id)
-    if not user:
-        logger.warning(f"User ID {user_id} not found for role update")
-        raise HTTPException(status_code=404, detail="User not found")
-
+    logger.debug("Admin %s updating role for user ID %s to %s", admin_user.email, user_id, role)
     # Validate and convert role to UserRole enum
-    try:
-        if role not in ("user", "admin"):
-            raise HTTPException(status_code=400, detail="Invalid role")
-        user.role = UserRole(role)
-    except ValueError:
+    new_role = _ASSIGNABLE_ROLES.get(role)
+    if new_role is None:
+        # A missing user still takes precedence over an invalid role; the lookup is
+        # only paid on this error path
+        if not await db.scalar(select(exists().where(User.id == user_id))):
+            logger.warning("User ID %s not found for role update", user_id)
+            raise HTTPException(status_code=404, detail="User not found")
         raise HTTPException(status_code=400, detail="Invalid role")
 
-    db.add(user)
+    # One UPDATE ... RETURNING instead of load, modify, commit and refresh
+    result = await db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(role=new_role)
+        .returning(User.id, User.email, User.role, User.created_at)
+        .execution_options(synchronize_session=False)
+    )
+    row = result.first()
+    if row is None:
+        logger.warning("User ID %s not found for role update", user_id)
+        raise HTTPException(status_code=404, detail="User not found")
     await db.commit()
-    await db.refresh(user)
-    logger.info(f"User ID {user_id} role updated to {role} by admin {admin_user.email}")
-    return UserOut.model_validate(user)
+    invalidate_cached_user(user_id)
+    logger.info("User ID %s role updated to %s by admin %s", user_id, role, admin_user.email)
+    return _user_response(row)
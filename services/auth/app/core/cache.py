@@ -0,0 +1,63 @@
+"""
+In-process caching helpers for the Auth Service.
+
+Provides TTLCache, a small bounded LRU mapping whose entries expire after a fixed
+time-to-live. Caches live in the worker process only: they are not shared between
+workers, so anything cached here must tolerate being stale for up to one TTL.
+"""
+
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+from typing import Any
+
+
+class TTLCache:
+    """
+    Bounded least-recently-used cache with per-entry expiry.
+
+    Attributes:
+        maxsize (int): Maximum number of entries kept before the oldest is evicted.
+        ttl (float): Number of seconds an entry stays valid after being stored.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Hashable) -> Any | None:
+        """Return the cached value for key, or None if it is missing or expired."""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        """
+        Store value under key, evicting the least recently used entry if full.
+
+        ttl overrides the cache-wide time-to-live for this entry only.
+        """
+        if ttl is None:
+            ttl = self.ttl
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        """Remove key from the cache if present."""
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove every entry from the cache."""
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
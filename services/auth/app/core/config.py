@@ -2,11 +2,11 @@
 Configuration module for the Auth Service.
 
 Defines the Settings class for application configuration, which loads values from environment variables or a .env file.
-Provides a cached get_settings() function for dependency injection.
+The settings are loaded once at import and exposed as the module-level `settings` instance.
 """
 
+from functools import cached_property
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from functools import lru_cache
 from pydantic import EmailStr, Field
 import os
 
@@ -22,6 +22,20 @@ class Settings(BaseSettings):
     database_url: str  # Async URL (used by app via SQLAlchemy+asyncpg)
     database_url_sync: str  # Sync URL (used by Alembic)
 
+    # Connection pool and asyncpg prepared-statement cache (statements kept per connection)
+    db_pool_size: int = 20
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 5  # Seconds to wait for a free connection before failing
+    db_pool_recycle: int = 1800  # Seconds before a pooled connection is replaced
+    # Ping on checkout; only worth its round-trip where something (a proxy, failover)
+    # can drop idle connections before db_pool_recycle replaces them
+    db_pool_pre_ping: bool = False
+    db_prepared_statement_cache_size: int = 512
+    # SQLAlchemy compiled-statement cache shared by the engine (SQLAlchemy default: 500)
+    db_query_cache_size: int = 2048
+    # SQL echo logs every statement on the event loop; kept separate from `debug`
+    db_echo: bool = False
+
     # Optional: used in logging
     db_host: str = Field(default="localhost")
     db_port: str = Field(default="5432")
@@ -32,6 +46,9 @@ class Settings(BaseSettings):
     access_token_expire_minutes: int
     refresh_token_expire_minutes: int = 60 * 24 * 7  # Default: 7 days
 
+    # Password hashing
+    bcrypt_rounds: int = 12  # Same cost factor passlib used by default
+
     # Guest user credentials
     guest_email: EmailStr = "guest@example.com"
     guest_password: str = "guest123"
@@ -39,16 +56,42 @@ class Settings(BaseSettings):
     # OpenTelemetry config
     otel_exporter_otlp_endpoint: str = "http://otel-collector:4317"
     otel_resource_attributes: str = "service.name=auth-service"
+    # Fraction of new traces recorded (OTEL_TRACES_SAMPLER_ARG); child spans, including
+    # the per-query SQLAlchemy spans, follow their parent's decision
+    otel_traces_sampler_arg: float = 0.05
+    # Span batching (OTEL_BSP_* env vars). A deeper queue and smaller, more frequent
+    # batches absorb login bursts without dropping spans or stalling shutdown.
+    otel_bsp_max_queue_size: int = 4096
+    otel_bsp_schedule_delay: int = 1000  # Milliseconds between exports
+    otel_bsp_max_export_batch_size: int = 256
+    otel_bsp_export_timeout: int = 10000  # Milliseconds
 
     model_config = SettingsConfigDict(
         env_file=".env.docker" if os.getenv("ENV", "local") == "docker" else ".env",
         env_file_encoding="utf-8",
+        # Settings are shared process-wide; freeze them so nothing mutates them at runtime
+        frozen=True,
+        extra="ignore",
     )
 
+    @cached_property
+    def access_token_expire_seconds(self) -> int:
+        """Access token lifetime in seconds, computed once."""
+        return self.access_token_expire_minutes * 60
+
+    @cached_property
+    def refresh_token_expire_seconds(self) -> int:
+        """Refresh token lifetime in seconds, computed once."""
+        return self.refresh_token_expire_minutes * 60
+
+
+settings = Settings() # type: ignore
+
 
-@lru_cache()
 def get_settings() -> Settings:
     """
-    Returns a cached instance of the Settings object for use throughout the application.
+    Returns the shared Settings instance.
+
+    Kept for callers that resolve settings through a function (e.g. Alembic, tests).
     """
-    return Settings() # type: ignore
+    return settings
@@ -36,3 +36,10 @@ guest_login_counter = Counter(
     "Total number of guest user logins",
     ["method"]
 )
+
+# Label children bound once at import; .labels() hashes the label values and takes a
+# lock on every call, so hot paths increment these directly
+password_login_counter = user_login_counter.labels(method="password")
+password_registration_counter = user_registration_counter.labels(method="password")
+refresh_rotation_counter = refresh_token_usage_counter.labels(method="refresh")
+admin_dashboard_access_counter = admin_action_counter.labels(action="dashboard_access")
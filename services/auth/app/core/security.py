@@ -2,69 +2,174 @@
 Security utilities for the Auth Service.
 
 Provides functions for password hashing and verification, as well as JWT access and refresh token creation.
-Uses bcrypt for password hashing and jose for JWT encoding.
+Uses the native bcrypt binding for password hashing and PyJWT for JWT encoding.
+
+Secrets are never compared with ``==``: password checks re-hash the candidate with
+the stored salt and compare the two digests with hmac.compare_digest, which runs in
+constant time regardless of where the inputs differ.
 """
 
-from passlib.context import CryptContext
-from datetime import datetime, timedelta, timezone
-from jose import JWTError, jwt
-from app.core.config import get_settings
-from uuid import uuid4
+import asyncio
+import base64
+import hmac
+import json
+import os
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+import jwt
+from app.core.config import settings
+from uuid import UUID
+
+# JWT signing parameters, resolved once instead of on every encode/decode
+_SIGNING_KEY = settings.secret_key.encode("utf-8")
+_ALGORITHM = settings.algorithm
+_ALGORITHMS = [settings.algorithm]
+
+# Upper bound on the base64 payload segment accepted by peek_unverified_claims
+_MAX_PAYLOAD_SEGMENT_LENGTH = 1024
 
-# Create a password context using bcrypt
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Dedicated pool for bcrypt work. bcrypt releases the GIL, so one thread per core is
+# enough to saturate the CPU, and a login storm can't exhaust the shared threadpool
+# that other blocking work (and the DB driver's sync fallbacks) rely on.
+_password_executor = ThreadPoolExecutor(
+    max_workers=os.cpu_count() or 1, thread_name_prefix="bcrypt"
+)
 
-settings = get_settings()
 
-def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
+def new_jti() -> UUID:
+    """
+    Generate a random JWT ID.
+
+    JTIs only need to be unique and unguessable, not RFC 4122 version-4 UUIDs, so this
+    wraps 16 bytes from secrets directly instead of going through uuid4(). The value is
+    stored in a native UUID column and carried in tokens as its 32-character hex form.
+    """
+    return UUID(bytes=secrets.token_bytes(16))
+
+
+def create_access_token(data: dict, expires_in: int | None = None, now: int | None = None) -> str:
     """
     Create a JWT access token with an embedded expiration claim ("exp").
 
     Args:
         data (dict): The data to encode in the token.
-        expires_delta (timedelta, optional): The time delta until the token expires. 
-            Defaults to settings.access_token_expire_minutes if not provided.
+        expires_in (int, optional): Seconds until the token expires.
+            Defaults to settings.access_token_expire_seconds if not provided.
+        now (int, optional): Current Unix time, so callers minting several tokens
+            can share one clock read. Defaults to the current time.
 
     Returns:
         str: The encoded JWT token.
     """
     to_encode = data.copy()
-    expire = datetime.now(tz=timezone.utc) + (
-        expires_delta or timedelta(minutes=settings.access_token_expire_minutes)
-    )
-    to_encode.update({"exp": int(expire.timestamp())})
-    encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
+    if expires_in is None:
+        expires_in = settings.access_token_expire_seconds
+    if now is None:
+        now = int(time.time())
+    to_encode["exp"] = now + expires_in
+    encoded_jwt = jwt.encode(to_encode, _SIGNING_KEY, algorithm=_ALGORITHM)
     return encoded_jwt
 
-def create_refresh_token(data: dict, expires_delta: timedelta | None = None) -> str:
+def create_refresh_token(data: dict, expires_in: int | None = None) -> str:
     """
     Create a JWT refresh token with an embedded expiration claim ("exp").
 
+    If the data carries an "iat" claim, the expiration is counted from it so the token
+    and its database record expire at the same second.
+
     Args:
         data (dict): The data to encode in the token.
-        expires_delta (timedelta, optional): The time delta until the token expires. 
-            Defaults to settings.refresh_token_expire_minutes if not provided.
+        expires_in (int, optional): Seconds until the token expires.
+            Defaults to settings.refresh_token_expire_seconds if not provided.
 
     Returns:
         str: The encoded JWT token.
     """
     to_encode = data.copy()
-    expire = datetime.now(tz=timezone.utc) + (
-        expires_delta or timedelta(minutes=settings.refresh_token_expire_minutes)
-    )
+    if expires_in is None:
+        expires_in = settings.refresh_token_expire_seconds
     # Only generate a new jti if not already present
     if "jti" not in to_encode:
-        to_encode["jti"] = str(uuid4())
-    to_encode.update({"exp": int(expire.timestamp())})
-    encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
+        to_encode["jti"] = new_jti().hex
+    to_encode["exp"] = to_encode.get("iat", int(time.time())) + expires_in
+    encoded_jwt = jwt.encode(to_encode, _SIGNING_KEY, algorithm=_ALGORITHM)
     return encoded_jwt
 
+def decode_token(token: str) -> dict:
+    """
+    Verify a JWT's signature and expiration and return its payload.
+
+    Args:
+        token (str): The encoded JWT.
+
+    Returns:
+        dict: The decoded payload.
+
+    Raises:
+        jwt.ExpiredSignatureError: If the token has expired.
+        jwt.InvalidTokenError: If the token is otherwise invalid.
+    """
+    return jwt.decode(token, _SIGNING_KEY, algorithms=_ALGORITHMS)
+
+def peek_unverified_claims(token: str) -> dict | None:
+    """
+    Parse a JWT's payload segment WITHOUT verifying its signature.
+
+    Only meant to reject malformed tokens before paying for signature verification;
+    the returned claims must never be trusted for anything else.
+
+    Args:
+        token (str): The encoded JWT.
+
+    Returns:
+        dict | None: The unverified claims, or None if the token is malformed or oversized.
+    """
+    parts = token.split(".")
+    if len(parts) != 3 or len(parts[1]) > _MAX_PAYLOAD_SEGMENT_LENGTH:
+        return None
+    segment = parts[1]
+    try:
+        claims = json.loads(base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4)))
+    except ValueError:
+        # Covers binascii.Error, UnicodeDecodeError and JSONDecodeError
+        return None
+    return claims if isinstance(claims, dict) else None
+
 def get_password_hash(password: str) -> str:
     """Hash a plain password using bcrypt."""
-    return pwd_context.hash(password)
+    salt = bcrypt.gensalt(rounds=settings.bcrypt_rounds)
+    return bcrypt.hashpw(password.encode("utf-8"), salt).decode("utf-8")
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Compare a plain password with its hashed version."""
-    return pwd_context.verify(plain_password, hashed_password)
+    """
+    Compare a plain password with its hashed version.
+
+    Hashes previously produced by passlib use the same modular crypt format
+    ($2a$/$2b$), so they verify unchanged. Anything else is rejected.
+    """
+    if not hashed_password.startswith(("$2a$", "$2b$", "$2y$")):
+        return False
+    stored = hashed_password.encode("utf-8")
+    try:
+        computed = bcrypt.hashpw(plain_password.encode("utf-8"), stored)
+    except ValueError:
+        # Malformed hash stored in the database
+        return False
+    return hmac.compare_digest(computed, stored)
 
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a plain password on the bcrypt pool without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_executor, get_password_hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Run verify_password on the bcrypt pool without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _password_executor, verify_password, plain_password, hashed_password
+    )
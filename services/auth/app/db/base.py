@@ -5,7 +5,8 @@ Note:
     Careful if importing models here, as it can lead to circular imports.
 """
 
-from sqlalchemy.orm import declarative_base
+from sqlalchemy.orm import DeclarativeBase
 
-Base = declarative_base()
 
+class Base(DeclarativeBase):
+    """Declarative base class shared by all ORM models."""
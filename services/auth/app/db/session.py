@@ -7,12 +7,26 @@ Defines the async SQLAlchemy engine and session factory, and provides a dependen
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from collections.abc import AsyncGenerator
 
-from app.core.config import get_settings
-
-settings = get_settings()
-
-# Create the async SQLAlchemy engine
-engine = create_async_engine(settings.database_url, echo=settings.debug)
+from app.core.config import settings
+
+
+# Create the async SQLAlchemy engine. The pool keeps connections (and the statements
+# asyncpg has prepared on them) warm, so repeated auth queries skip parse/plan.
+engine = create_async_engine(
+    settings.database_url,
+    echo=settings.db_echo,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_recycle=settings.db_pool_recycle,
+    # Off by default: connections are recycled well before server-side timeouts, so a
+    # pre-ping would only add a round-trip to every checkout
+    pool_pre_ping=settings.db_pool_pre_ping,
+    query_cache_size=settings.db_query_cache_size,
+    connect_args={
+        "prepared_statement_cache_size": settings.db_prepared_statement_cache_size,
+    },
+)
 
 # Create a session factory
 AsyncSessionLocal = async_sessionmaker(
@@ -31,3 +45,14 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
     """
     async with AsyncSessionLocal() as session:
         yield session
+
+
+def get_sessionmaker() -> async_sessionmaker[AsyncSession]:
+    """
+    Dependency that provides the session factory, for work that outlives the request
+    (e.g. background tasks) and so cannot use the request's session.
+
+    Returns:
+        async_sessionmaker[AsyncSession]: The application's session factory.
+    """
+    return AsyncSessionLocal
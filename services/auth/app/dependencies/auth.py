@@ -6,15 +6,31 @@ Provides:
 - require_role: Dependency factory for role-based access control on endpoints.
 """
 
+import time
+from functools import lru_cache
 from fastapi import Request, Depends, HTTPException, status
-from jose import JWTError, jwt
+import jwt
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import get_db
 from app.models.user import User
-from app.services.auth import get_user_by_email
-from app.core.config import get_settings
+from app.services.auth import get_user_by_id
+from app.core.security import decode_token
+
+
+@lru_cache(maxsize=4096)
+def _decode_access_token(token: str, second: int) -> dict:
+    """
+    Verify and decode an access token, memoized per (token, second).
+
+    Keying on the current second means a token reused within the same second is only
+    verified once, while expiry is still re-checked at least once per second.
+    The returned payload is shared between callers and must not be mutated.
+
+    Raises:
+        jwt.InvalidTokenError: If the token is invalid or expired.
+    """
+    return decode_token(token)
 
-settings = get_settings()
 
 async def get_current_user(
     request: Request,
@@ -37,14 +53,14 @@ async def get_current_user(
     if not token:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
     try:
-        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+        payload = _decode_access_token(token, int(time.time()))
         sub = payload.get("sub")
         if sub is None:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token: missing subject")
         user_id = int(sub)
-    except JWTError:
+    except jwt.InvalidTokenError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    user = await db.get(User, user_id)
+    user = await get_user_by_id(db, user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
     return user
@@ -1,4 +1,84 @@
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+"""
+Per-client rate limiting for the Auth Service.
 
-limiter = Limiter(key_func=get_remote_address)
\ No newline at end of file
+Provides TokenBucketLimiter, a FastAPI dependency that enforces a token bucket per client
+IP. State is a plain dict held in the worker process: checking a request is one dict
+lookup and a few float operations, with no locking (the event loop is single-threaded).
+Limits are per worker, so with N workers a client can make up to N times the configured rate.
+"""
+
+import math
+import time
+
+from fastapi import HTTPException, Request, status
+
+_limiters: list["TokenBucketLimiter"] = []
+
+
+class TokenBucketLimiter:
+    """
+    Token bucket rate limiter keyed by client IP.
+
+    Each client starts with a full bucket of `capacity` tokens, which refills continuously
+    at capacity / period tokens per second. Every request spends one token; a request that
+    finds the bucket empty is rejected with 429.
+
+    Attributes:
+        capacity (int): Maximum burst size (and tokens per period).
+        rate (float): Tokens added back per second.
+    """
+
+    def __init__(self, capacity: int, period: float) -> None:
+        self.capacity = capacity
+        self.rate = capacity / period
+        # client -> (tokens, last_refill)
+        self._buckets: dict[str, tuple[float, float]] = {}
+        # A bucket left alone this long is full again and can be forgotten
+        self._idle_after = period
+        self._next_sweep = time.monotonic() + period
+        _limiters.append(self)
+
+    async def __call__(self, request: Request) -> None:
+        """
+        Spend one token for the requesting client, or raise 429 if none is left.
+
+        Raises:
+            HTTPException: If the client's bucket is empty.
+        """
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._sweep(now)
+
+        key = request.client.host if request.client else "127.0.0.1"
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            tokens = self.capacity
+        else:
+            tokens, last = bucket
+            tokens = min(self.capacity, tokens + (now - last) * self.rate)
+
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            retry_after = math.ceil((1 - tokens) / self.rate)
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded",
+                headers={"Retry-After": str(retry_after)},
+            )
+        self._buckets[key] = (tokens - 1, now)
+
+    def _sweep(self, now: float) -> None:
+        """Drop buckets that have been idle long enough to be full again."""
+        cutoff = now - self._idle_after
+        self._buckets = {k: v for k, v in self._buckets.items() if v[1] > cutoff}
+        self._next_sweep = now + self._idle_after
+
+    def reset(self) -> None:
+        """Forget every client's bucket."""
+        self._buckets.clear()
+
+
+def reset_rate_limits() -> None:
+    """Reset every TokenBucketLimiter created in this process (used by tests)."""
+    for limiter in _limiters:
+        limiter.reset()
@@ -1,10 +1,32 @@
+import atexit
 import logging
+import queue
 import sys
+from logging.handlers import QueueHandler, QueueListener
 from pythonjsonlogger.json import JsonFormatter
 
+# Records waiting to be written; beyond this, new records are dropped rather than
+# making the event loop wait on stdout
+_LOG_QUEUE_SIZE = 10000
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """QueueHandler that silently drops records when the queue is full."""
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
 def setup_logging():
     """
     Configures root logger to output JSON formatted logs to stdout.
+
+    Loggers only put records on a queue; a QueueListener thread does the JSON
+    formatting and the stdout writes, so a slow or blocked stdout never stalls
+    the event loop.
     """
     log_handler = logging.StreamHandler(sys.stdout)
     formatter = JsonFormatter(
@@ -12,7 +34,13 @@ def setup_logging():
     )
     log_handler.setFormatter(formatter)
 
+    log_queue: queue.Queue = queue.Queue(maxsize=_LOG_QUEUE_SIZE)
+    listener = QueueListener(log_queue, log_handler, respect_handler_level=True)
+    listener.start()
+    # Flush whatever is still queued when the process exits
+    atexit.register(listener.stop)
+
     root_logger = logging.getLogger()
     root_logger.setLevel(logging.INFO)
-    root_logger.handlers = [log_handler]
+    root_logger.handlers = [_DroppingQueueHandler(log_queue)]
     root_logger.propagate = False
@@ -5,14 +5,18 @@ This module contains the RefreshToken class, which represents refresh tokens use
 authentication token rotation, including their relationship to users and expiration logic.
 """
 
-from datetime import datetime, timedelta, timezone
-from uuid import uuid4
+from datetime import datetime
+from typing import TYPE_CHECKING
+from uuid import UUID
 
-from sqlalchemy import String, Boolean, DateTime, ForeignKey
+from sqlalchemy import Boolean, DateTime, ForeignKey, Index, Uuid, func, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base import Base
 
+if TYPE_CHECKING:
+    from app.models.user import User
+
 
 class RefreshToken(Base):
     """
@@ -23,19 +27,22 @@ class RefreshToken(Base):
     """
 
     __tablename__ = "refresh_tokens"
+    __table_args__ = (
+        # Per-user lookups of active tokens (logout revocation, listing valid tokens)
+        Index(
+            "ix_refresh_tokens_user_active_expires",
+            "user_id",
+            "expires_at",
+            postgresql_where=text("is_active"),
+        ),
+    )
 
-    id: Mapped[str] = mapped_column(
-        String,
+    # The JTI is already random and unique, so it doubles as the primary key: one
+    # 16-byte index per insert instead of a separate surrogate key plus a unique JTI index
+    jti: Mapped[UUID] = mapped_column(
+        Uuid,
         primary_key=True,
-        default=lambda: str(uuid4()),
-        doc="Primary key: UUID string for the refresh token record."
-    )
-    jti: Mapped[str] = mapped_column(
-        String(64),
-        unique=True,
-        nullable=False,
-        index=True,
-        doc="JWT ID (JTI) claim: unique identifier for the refresh token."
+        doc="Primary key: JWT ID (JTI) claim identifying the refresh token."
     )
 
     user_id: Mapped[int] = mapped_column(
@@ -53,19 +60,20 @@ class RefreshToken(Base):
 
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
-        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now(),
         nullable=False,
         doc="Timestamp when the refresh token was created."
     )
 
     expires_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
-        default=lambda: datetime.now(timezone.utc) + timedelta(days=7),
+        # Callers pass the JWT's own expiry; this only backs up inserts that omit it
+        server_default=text("now() + interval '7 days'"),
         nullable=False,
         doc="Timestamp when the refresh token expires."
     )
 
-    user = relationship(
+    user: Mapped["User"] = relationship(
         "User",
         back_populates="refresh_tokens",
         doc="Relationship to the owning User."
@@ -73,4 +81,4 @@ class RefreshToken(Base):
 
     def __repr__(self) -> str:
         """String representation for debugging purposes."""
-        return f"<RefreshToken id={self.id} user_id={self.user_id} is_active={self.is_active}>"
+        return f"<RefreshToken jti={self.jti} user_id={self.user_id} is_active={self.is_active}>"
@@ -5,13 +5,18 @@ This module contains the User class, which represents users in the authenticatio
 including authentication, authorization, and relationships to refresh tokens.
 """
 
-from datetime import datetime, timezone
-from sqlalchemy import String, Boolean, DateTime, Enum as SQLEnum
+from datetime import datetime
+from typing import TYPE_CHECKING
+from uuid import UUID
+from sqlalchemy import String, Boolean, DateTime, Enum as SQLEnum, Index, Uuid, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base import Base
 from app.schemas.enums import UserRole
 
+if TYPE_CHECKING:
+    from app.models.refresh_token import RefreshToken
+
 
 class User(Base):
     """
@@ -25,7 +30,7 @@ class User(Base):
         hashed_password (str): Hashed user password.
         is_active (bool): Whether the user account is active.
         is_superuser (bool): Whether the user has superuser privileges.
-        last_refresh_jti (str | None): JTI of the latest valid refresh token for this user.
+        last_refresh_jti (UUID | None): JTI of the latest valid refresh token for this user.
         refresh_tokens (list[RefreshToken]): Relationship to the user's refresh tokens.
         created_at (datetime): Timestamp when the user was created.
         updated_at (datetime): Timestamp when the user was last updated.
@@ -53,13 +58,13 @@ class User(Base):
         doc="Whether the user has superuser privileges."
     )
 
-    last_refresh_jti: Mapped[str | None] = mapped_column(
-        String(64),
+    last_refresh_jti: Mapped[UUID | None] = mapped_column(
+        Uuid,
         nullable=True,
         doc="The jti of the latest valid refresh token for this user."
     )
 
-    refresh_tokens = relationship(
+    refresh_tokens: Mapped[list["RefreshToken"]] = relationship(
         "RefreshToken",
         back_populates="user",
         cascade="all, delete-orphan",
@@ -68,15 +73,15 @@ class User(Base):
 
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
-        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now(),
         nullable=False,
         doc="Timestamp when the user was created."
     )
 
     updated_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
-        default=lambda: datetime.now(timezone.utc),
-        onupdate=lambda: datetime.now(timezone.utc),
+        server_default=func.now(),
+        onupdate=func.now(),
         nullable=False,
         doc="Timestamp when the user was last updated."
     )
@@ -94,3 +99,11 @@ class User(Base):
             f"<User id={self.id} email={self.email} "
             f"is_active={self.is_active} is_superuser={self.is_superuser}>"
         )
+
+
+# Email domain (suffix) matches, queried as a prefix LIKE on the reversed email
+Index(
+    "ix_users_email_reversed",
+    func.reverse(User.email).label("email_reversed"),
+    postgresql_ops={"email_reversed": "text_pattern_ops"},
+)
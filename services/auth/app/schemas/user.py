@@ -5,18 +5,25 @@ Defines schemas for user creation, login, output, and authentication tokens.
 These are used for request validation and response serialization in the Auth Service API.
 """
 
-from pydantic import BaseModel, EmailStr, ConfigDict
+from pydantic import BaseModel, EmailStr, ConfigDict, field_validator
 from typing import Literal
 from .enums import UserRole
 from datetime import datetime
 
 
+def _normalize_email(email: str) -> str:
+    """Lowercase an email so it matches the stored, pre-normalized column."""
+    return email.lower()
+
+
 class UserBase(BaseModel):
     """
     Base schema for user objects, containing shared fields.
     """
     email: EmailStr
 
+    _lowercase_email = field_validator("email")(_normalize_email)
+
 
 class UserCreatePublic(UserBase):
     """
@@ -33,10 +40,14 @@ class UserCreateAdmin(UserBase):
     role: UserRole
 
 
-class UserOut(UserBase):
+class UserOut(BaseModel):
     """
     Schema for user data returned from the API.
+
+    The email is a plain str: it comes from the database, where it was validated on
+    the way in, so responses skip another pass through the email validator.
     """
+    email: str
     id: int
     role: UserRole
     created_at: datetime | None
@@ -50,6 +61,8 @@ class UserLogin(BaseModel):
     email: EmailStr
     password: str
 
+    _lowercase_email = field_validator("email")(_normalize_email)
+
 
 class Token(BaseModel):
     access_token: str
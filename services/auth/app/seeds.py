@@ -1,33 +1,40 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import exists, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from app.models.user import User
-from app.core.security import get_password_hash
+from app.core.security import get_password_hash_async
 from app.schemas.enums import UserRole
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 async def create_guest_user_if_not_exists(db: AsyncSession):
     """
     Seed a guest/demo user if one doesn't already exist.
     Uses email and password from environment variables or defaults.
+
+    The usual case (guest already seeded) costs a single EXISTS query; the bcrypt hash
+    is only computed when a seed is needed. The insert is ON CONFLICT DO NOTHING, so
+    workers starting at the same time cannot race into a duplicate-email error.
     """
-    guest_email = os.getenv("GUEST_EMAIL", "guest@example.com")
+    guest_email = os.getenv("GUEST_EMAIL", "guest@example.com").lower()
     guest_password = os.getenv("GUEST_PASSWORD", "guest123")  # Should be in .env
-    guest_role = UserRole.guest
 
-    # Check if guest user already exists
-    result = await db.execute(select(User).where(User.email == guest_email))
-    user = result.scalar_one_or_none()
-    
-    if not user:
-        # Hash the guest password before storing
-        hashed_password = get_password_hash(guest_password)
-        new_user = User(
-            email=guest_email,
-            hashed_password=hashed_password,
-            role=guest_role
-        )
-        db.add(new_user)
-        await db.commit()
-        print("Guest user seeded.")
+    if await db.scalar(select(exists().where(User.email == guest_email))):
+        logger.info("Guest user already exists.")
+        return
+
+    # Hash the guest password before storing
+    hashed_password = await get_password_hash_async(guest_password)
+    result = await db.execute(
+        pg_insert(User)
+        .values(email=guest_email, hashed_password=hashed_password, role=UserRole.guest)
+        .on_conflict_do_nothing(index_elements=[User.email])
+        .returning(User.id)
+    )
+    await db.commit()
+    if result.first() is not None:
+        logger.info("Guest user seeded.")
     else:
-        print("Guest user already exists.")
\ No newline at end of file
+        logger.info("Guest user already exists.")
@@ -1,61 +1,163 @@
 """
 Service functions for user management and refresh token handling.
 
-This module provides asynchronous functions for creating users, retrieving users by email,
-and revoking refresh tokens (either a specific token or all tokens for a user).
+This module provides asynchronous functions for creating users, looking up login
+credentials and the current user, and revoking refresh tokens (either a specific token
+or all tokens for a user).
 """
 
+from uuid import UUID
 from sqlalchemy.orm import Session
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
+from sqlalchemy import select, update, lambda_stmt
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import load_only, make_transient_to_detached
 from app.models.user import User
 from app.models.refresh_token import RefreshToken
 from app.schemas.user import UserCreatePublic
-from app.core.security import get_password_hash
+from app.core.cache import TTLCache
+from app.core.security import get_password_hash_async
 
+# Login credentials (id, hashed_password) keyed by email, so repeated login attempts
+# for the same account skip the database lookup
+_credentials_cache = TTLCache(maxsize=1024, ttl=30)
 
-async def create_user(db: AsyncSession, user_create: UserCreatePublic) -> User:
+# Column values of recently authenticated users keyed by ID, so chatty clients don't
+# load their user row on every request. Kept short because other workers' changes
+# (role updates, deletes) are only seen once an entry expires.
+_user_cache = TTLCache(maxsize=10000, ttl=5)
+
+# The columns authenticated routes read from the current user (UserOut and role checks)
+_CURRENT_USER_COLUMNS = (User.id, User.email, User.role, User.created_at)
+_CURRENT_USER_KEYS = tuple(column.key for column in _CURRENT_USER_COLUMNS)
+
+
+async def create_user(db: AsyncSession, user_create: UserCreatePublic) -> User | None:
     """
     Create a new user with a hashed password and default role.
 
+    Uses a single INSERT ... ON CONFLICT DO NOTHING RETURNING, so an existing email
+    (in any letter case) is detected by the unique indexes rather than a prior SELECT,
+    and two concurrent registrations cannot both succeed.
+
     Args:
         db (AsyncSession): The database session.
         user_create (UserCreatePublic): The user creation data.
 
     Returns:
-        User: The created user instance.
+        User | None: The created user instance, or None if the email is already registered.
     """
-    hashed_password = get_password_hash(user_create.password)
-    db_user = User(
-        email=user_create.email,
-        hashed_password=hashed_password,
-        role="user"  # default role for public user creation
+    # Hash off the event loop on the dedicated bcrypt pool
+    hashed_password = await get_password_hash_async(user_create.password)
+    result = await db.scalars(
+        pg_insert(User)
+        .values(
+            email=user_create.email,
+            hashed_password=hashed_password,
+            role="user",  # default role for public user creation
+        )
+        .on_conflict_do_nothing()
+        .returning(User)
     )
-    db.add(db_user)
+    db_user = result.one_or_none()
+    if db_user is None:
+        return None
     await db.commit()
-    await db.refresh(db_user)
+    invalidate_user_credentials(db_user.email)
     return db_user
 
 
-async def get_user_by_email(db: AsyncSession, email: str) -> User | None:
+async def get_user_credentials_by_email(db: AsyncSession, email: str) -> tuple[int, str] | None:
     """
-    Retrieve a user by their email address.
+    Retrieve the ID and password hash of a user by email (case-insensitive), for password verification.
+
+    Results are cached per worker for a short time; only these two columns are cached,
+    never the ORM instance, so nothing session-bound outlives the request.
 
     Args:
         db (AsyncSession): The database session.
         email (str): The user's email address.
 
+    Returns:
+        tuple[int, str] | None: The user's ID and hashed password if found, otherwise None.
+    """
+    key = email.lower()
+    credentials = _credentials_cache.get(key)
+    if credentials is not None:
+        return credentials
+
+    result = await db.execute(
+        lambda_stmt(
+            lambda: select(User.id, User.hashed_password)
+            .where(User.email == key)
+        )
+    )
+    row = result.first()
+    if row is None:
+        return None
+    credentials = (row.id, row.hashed_password)
+    _credentials_cache.set(key, credentials)
+    return credentials
+
+
+def invalidate_user_credentials(email: str | None = None) -> None:
+    """
+    Drop cached login credentials for one email, or for every user if no email is given.
+
+    Args:
+        email (str | None): The email to invalidate, or None to clear the whole cache.
+    """
+    if email is None:
+        _credentials_cache.clear()
+    else:
+        _credentials_cache.pop(email.lower())
+
+
+async def get_user_by_id(db: AsyncSession, user_id: int) -> User | None:
+    """
+    Retrieve a user by ID, served from a short-lived per-worker cache when possible.
+
+    Only id, email, role and created_at are loaded; other attributes are unavailable
+    on the returned instance. Cache hits return a detached User rebuilt from the cached
+    column values; it is not attached to db, so callers that want to modify it must add
+    or merge it first.
+
+    Args:
+        db (AsyncSession): The database session.
+        user_id (int): The user's ID.
+
     Returns:
         User | None: The user instance if found, otherwise None.
     """
-    result = await db.execute(select(User).filter(User.email == email))
-    return result.scalar_one_or_none()
+    values = _user_cache.get(user_id)
+    if values is not None:
+        user = User(**values)
+        make_transient_to_detached(user)
+        return user
+
+    user = await db.get(User, user_id, options=[load_only(*_CURRENT_USER_COLUMNS)])
+    if user is not None:
+        _user_cache.set(user_id, {key: getattr(user, key) for key in _CURRENT_USER_KEYS})
+    return user
+
+
+def invalidate_cached_user(user_id: int | None = None) -> None:
+    """
+    Drop one cached user, or every cached user if no ID is given.
+
+    Args:
+        user_id (int | None): The ID to invalidate, or None to clear the whole cache.
+    """
+    if user_id is None:
+        _user_cache.clear()
+    else:
+        _user_cache.pop(user_id)
 
 
 async def revoke_refresh_token(
     db: AsyncSession,
-    user: User,
-    jti: str | None = None,
+    user_id: int,
+    jti: UUID | None = None,
     clear_jti: bool = True
 ) -> None:
     """
@@ -63,30 +165,33 @@ async def revoke_refresh_token(
 
     If a JTI is provided, only the specified token is deactivated (used for token misuse/reuse).
     If no JTI is provided, all active tokens for the user are deactivated (used for logout).
+    Everything is sent as a single UPDATE, then committed.
 
     Args:
         db (AsyncSession): The database session.
-        user (User): The user whose tokens are to be revoked.
-        jti (str | None): The JTI of the token to revoke, or None to revoke all.
+        user_id (int): The ID of the user whose tokens are to be revoked.
+        jti (UUID | None): The JTI of the token to revoke, or None to revoke all.
         clear_jti (bool): Whether to clear the user's last_refresh_jti field.
     """
-    from app.models.refresh_token import RefreshToken
     if jti:
         # Only deactivate the offending token
-        await db.execute(
-            update(RefreshToken)
-            .where(RefreshToken.user_id == user.id, RefreshToken.jti == jti)
-            .values(is_active=False)
+        stmt = update(RefreshToken).where(
+            RefreshToken.user_id == user_id, RefreshToken.jti == jti
         )
     else:
         # Deactivate all tokens (e.g., on logout)
-        await db.execute(
-            update(RefreshToken)
-            .where(RefreshToken.user_id == user.id, RefreshToken.is_active == True)
-            .values(is_active=False)
+        stmt = update(RefreshToken).where(
+            RefreshToken.user_id == user_id, RefreshToken.is_active == True
         )
+    stmt = stmt.values(is_active=False)
     if clear_jti:
-        user.last_refresh_jti = None
-        db.add(user)
+        # Clear the user's JTI in the same statement (one round-trip) via a data-modifying CTE
+        stmt = stmt.add_cte(
+            update(User)
+            .where(User.id == user_id)
+            .values(last_refresh_jti=None)
+            .cte("cleared")
+        )
+    await db.execute(stmt)
     await db.commit()
-    await db.refresh(user)
\ No newline at end of file
+    invalidate_cached_user(user_id)
@@ -1,123 +1,193 @@
 """
 Service functions for managing refresh tokens.
 
-This module provides asynchronous helpers for creating, deactivating, validating,
-and retrieving refresh tokens in the authentication system.
+This module provides asynchronous helpers for recording (after login, or in bulk),
+rotating and retrieving refresh tokens in the authentication system.
 """
 
+import logging
 from datetime import datetime, timezone
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
+from uuid import UUID
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy import (
+    DateTime, Row, Uuid, insert, lambda_stmt, literal, select, true, update,
+)
 
 from app.models.refresh_token import RefreshToken
+from app.models.user import User
 
+logger = logging.getLogger(__name__)
 
-async def create_refresh_token(
-    db: AsyncSession, jti: str, user_id: int, expires_at: datetime
-) -> RefreshToken:
+
+async def persist_refresh_token(
+    session_factory: async_sessionmaker[AsyncSession], jti: UUID, user_id: int, expires_at: datetime
+) -> None:
     """
-    Create and persist a new refresh token for a user.
+    Record a newly issued refresh token in its own session, for use as a background task.
+
+    The record is bookkeeping (logout revocation, auditing): refresh validity is decided
+    by users.last_refresh_jti, so a failed write is logged rather than raised.
+
+    The write runs after the response, so a /refresh or /logout for the same user may
+    already have been processed and found no row to deactivate. The insert therefore
+    selects from the user's row (locked FOR SHARE, so a rotation in flight finishes first)
+    and stores the token as active only while it is still the user's last_refresh_jti.
+    A superseded or revoked token is recorded inactive, and nothing is written if the
+    user no longer exists.
 
     Args:
-        db (AsyncSession): The database session.
-        jti (str): The unique JWT ID for the refresh token.
+        session_factory (async_sessionmaker[AsyncSession]): Factory for the task's session.
+        jti (UUID): The unique JWT ID for the refresh token.
         user_id (int): The ID of the user to associate the token with.
         expires_at (datetime): The expiration datetime for the token.
-
-    Returns:
-        RefreshToken: The newly created refresh token instance.
     """
-    new_token = RefreshToken(
-        jti=jti,
-        user_id=user_id,
-        expires_at=expires_at,
-        is_active=True,
+    stmt = (
+        pg_insert(RefreshToken)
+        .from_select(
+            ["jti", "user_id", "is_active", "expires_at"],
+            select(
+                literal(jti, Uuid),
+                User.id,
+                User.last_refresh_jti.is_not_distinct_from(literal(jti, Uuid)),
+                literal(expires_at, DateTime(timezone=True)),
+            )
+            .where(User.id == user_id)
+            .with_for_update(read=True)
+        )
+        .on_conflict_do_nothing(index_elements=[RefreshToken.jti])
     )
-    db.add(new_token)
-    await db.flush()
-    return new_token
+    try:
+        async with session_factory() as db:
+            await db.execute(stmt)
+            await db.commit()
+    except Exception:
+        logger.exception("Failed to persist refresh token JTI %s for user ID %s", jti, user_id)
 
 
-async def deactivate_refresh_token(db, jti: str):
+async def create_refresh_tokens_bulk(db: AsyncSession, rows: list[dict]) -> None:
     """
-    Deactivate a refresh token by its JTI.
+    Insert many refresh token records at once, for seeding and imports.
+
+    The rows go through a single executemany, which SQLAlchemy sends to asyncpg as
+    batched multi-row INSERTs instead of one statement and round-trip per token.
+    JTIs that already exist are skipped. The caller commits.
 
     Args:
         db (AsyncSession): The database session.
-        jti (str): The JWT ID of the refresh token to deactivate.
+        rows (list[dict]): Records with ``jti``, ``user_id`` and ``expires_at`` keys
+            (``is_active`` optional, defaulting to True).
     """
-    from app.models.refresh_token import RefreshToken
-    result = await db.execute(
-        select(RefreshToken).where(RefreshToken.jti == jti)
+    if not rows:
+        return
+    await db.execute(
+        pg_insert(RefreshToken).on_conflict_do_nothing(index_elements=[RefreshToken.jti]),
+        rows,
     )
-    token = result.scalar_one_or_none()
-    if token:
-        token.is_active = False
-        db.add(token)
 
 
-async def is_refresh_token_valid(db: AsyncSession, jti: str) -> bool:
+async def rotate_refresh_token(
+    db: AsyncSession, user_id: int, old_jti: UUID, new_jti: UUID, expires_at: datetime
+) -> bool:
     """
-    Check if a refresh token is valid (active and not expired).
+    Replace a user's active refresh token with a new one in a single statement.
+
+    Records the new JTI on the user, deactivates the old token and inserts the new one
+    through one CTE (one round-trip). Nothing changes unless the old token is the user's
+    last issued JTI, so a token consumed concurrently or superseded by a newer one is
+    never rotated.
+    The caller commits.
 
     Args:
         db (AsyncSession): The database session.
-        jti (str): The JWT ID of the refresh token.
+        user_id (int): The ID of the user owning the token.
+        old_jti (UUID): The JTI of the token being rotated out.
+        new_jti (UUID): The JTI of the new token.
+        expires_at (datetime): The expiration datetime for the new token.
 
     Returns:
-        bool: True if the token is valid, False otherwise.
+        bool: True if the rotation happened, False if old_jti was no longer current.
     """
+    rotated = (
+        update(User)
+        # Chain check in SQL: only the most recently issued token may rotate
+        .where(User.id == user_id, User.last_refresh_jti == old_jti)
+        .values(last_refresh_jti=new_jti)
+        .returning(User.id)
+        .cte("rotated")
+    )
+    deactivated = (
+        update(RefreshToken)
+        .where(
+            RefreshToken.jti == old_jti,
+            RefreshToken.user_id.in_(select(rotated.c.id)),
+        )
+        .values(is_active=False)
+        .cte("deactivated")
+    )
     result = await db.execute(
-        select(RefreshToken).where(
-            RefreshToken.jti == jti,
-            RefreshToken.is_active == True,
-            RefreshToken.expires_at > datetime.now(timezone.utc),
+        insert(RefreshToken)
+        .from_select(
+            ["jti", "user_id", "is_active", "expires_at"],
+            select(
+                literal(new_jti, Uuid),
+                rotated.c.id,
+                true(),
+                literal(expires_at, DateTime(timezone=True)),
+            ),
         )
+        .add_cte(deactivated)
+        .returning(RefreshToken.user_id)
     )
-    return result.scalar_one_or_none() is not None
+    return result.first() is not None
 
 
-async def get_all_valid_refresh_tokens_for_user(db, user_id: int):
+async def get_user_refresh_state(db: AsyncSession, user_id: int) -> Row | None:
     """
-    Retrieve all valid (active and unexpired) refresh tokens for a user.
+    Load the columns a refresh token rotation needs for a user.
+
+    The user's last_refresh_jti acts as a per-user token version: it names the only
+    refresh token that may be used, and logout clears it. Comparing it with the token's
+    JTI therefore covers reuse and revocation without a refresh_tokens lookup (expiry
+    is enforced by the token's own exp claim).
+    The user row is locked (SELECT ... FOR UPDATE) until the caller's transaction ends, so
+    concurrent rotations for the same user are serialized.
 
     Args:
         db (AsyncSession): The database session.
         user_id (int): The ID of the user.
 
     Returns:
-        list[RefreshToken]: List of valid refresh tokens for the user.
+        Row | None: A row with ``id``, ``role`` and ``last_refresh_jti``, or None if
+            the user does not exist.
     """
-    from app.models.refresh_token import RefreshToken
-
+    # lambda_stmt caches the compiled SQL; user_id is bound per call
     result = await db.execute(
-        select(RefreshToken).where(
-            RefreshToken.user_id == user_id,
-            RefreshToken.is_active == True,
-            RefreshToken.expires_at > datetime.now(timezone.utc),
+        lambda_stmt(
+            lambda: select(User.id, User.role, User.last_refresh_jti)
+            .where(User.id == user_id)
+            .with_for_update()
         )
     )
-    return result.scalars().all()
+    return result.first()
 
 
-async def get_refresh_token_from_db(db, jti: str, user_id: int):
+async def get_all_valid_refresh_tokens_for_user(db: AsyncSession, user_id: int):
     """
-    Retrieve a refresh token by its JTI and user ID.
+    Retrieve all valid (active and unexpired) refresh tokens for a user.
 
     Args:
         db (AsyncSession): The database session.
-        jti (str): The JWT ID of the refresh token.
         user_id (int): The ID of the user.
 
     Returns:
-        RefreshToken | None: The refresh token instance if found, else None.
+        list[RefreshToken]: List of valid refresh tokens for the user.
     """
-    from app.models.refresh_token import RefreshToken
-
     result = await db.execute(
         select(RefreshToken).where(
-            RefreshToken.jti == jti,
             RefreshToken.user_id == user_id,
+            RefreshToken.is_active == True,
+            RefreshToken.expires_at > datetime.now(timezone.utc),
         )
     )
-    return result.scalar_one_or_none()
+    return result.scalars().all()
@@ -0,0 +1,30 @@
+"""
+Shared helpers for Alembic migration scripts.
+
+Import from a revision as ``from migrations.helpers import drop_index_if_invalid``
+(alembic.ini puts the service root on sys.path).
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def drop_index_if_invalid(index_name: str) -> None:
+    """
+    Drop an index left INVALID by a failed ``CREATE INDEX CONCURRENTLY``.
+
+    A concurrent build that fails (or is interrupted) leaves the index behind, marked
+    invalid: it is maintained on every write but never used, and ``IF NOT EXISTS`` would
+    skip rebuilding it. Dropping it first lets a rerun build it again. Must be called
+    inside an autocommit block, since DROP INDEX CONCURRENTLY cannot run in a transaction.
+
+    Args:
+        index_name (str): Name of the index, resolved through the search_path.
+    """
+    bind = op.get_bind()
+    invalid = bind.execute(
+        sa.text("SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"),
+        {"name": index_name},
+    ).scalar()
+    if invalid:
+        op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{index_name}"')
@@ -0,0 +1,30 @@
+"""Drop duplicate unique constraint on refresh_tokens.jti
+
+Revision ID: 10e7c3465815
+Revises: eb127b918d2d
+Create Date: 2026-10-16 00:06:41.728844
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '10e7c3465815'
+down_revision: Union[str, None] = 'eb127b918d2d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The unique ix_refresh_tokens_jti already enforces uniqueness (and serves as the
+    # ON CONFLICT arbiter); the second index only doubled the write cost of every insert
+    op.drop_constraint("refresh_tokens_jti_key", "refresh_tokens", type_="unique")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_unique_constraint("refresh_tokens_jti_key", "refresh_tokens", ["jti"])
@@ -0,0 +1,109 @@
+"""Store refresh token JTI columns as native UUID
+
+Revision ID: 10f0a485e4d1
+Revises: b4ba0f66460d
+Create Date: 2026-10-15 23:08:44.651370
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlalchemy.dialects.postgresql as psql
+
+from migrations.helpers import drop_index_if_invalid
+
+
+# revision identifiers, used by Alembic.
+revision: str = '10f0a485e4d1'
+down_revision: Union[str, None] = 'b4ba0f66460d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Rows per committed batch when backfilling the uuid columns
+BACKFILL_CHUNK_SIZE = 1000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # An in-place ALTER ... TYPE uuid USING would rewrite both tables under ACCESS
+    # EXCLUSIVE, blocking logins for the whole copy. Like 56e9b5c736da, convert by
+    # column swap: add uuid columns, backfill them in committed batches, build the
+    # unique indexes concurrently, then swap under a short lock. The autocommit blocks
+    # make this revision non-atomic, so every step before the swap is idempotent; the
+    # swap commits together with the version stamp.
+    bind = op.get_bind()
+    op.add_column("refresh_tokens", sa.Column("jti_new", psql.UUID(as_uuid=True)), if_not_exists=True)
+    op.add_column("users", sa.Column("last_refresh_jti_new", psql.UUID(as_uuid=True)), if_not_exists=True)
+
+    # Existing values are str(uuid4()), which Postgres casts to uuid directly
+    with op.get_context().autocommit_block():
+        # refresh_tokens has a string primary key, so batch by key rather than by range
+        while True:
+            updated = bind.execute(
+                sa.text(
+                    "UPDATE refresh_tokens SET jti_new = jti::uuid WHERE id IN ("
+                    "SELECT id FROM refresh_tokens WHERE jti_new IS NULL LIMIT :n)"
+                ),
+                {"n": BACKFILL_CHUNK_SIZE},
+            ).rowcount
+            if not updated:
+                break
+        max_id = bind.execute(sa.text("SELECT max(id) FROM users")).scalar() or 0
+        for lo in range(0, max_id + 1, BACKFILL_CHUNK_SIZE):
+            bind.execute(
+                sa.text(
+                    "UPDATE users SET last_refresh_jti_new = last_refresh_jti::uuid "
+                    "WHERE id BETWEEN :lo AND :hi AND last_refresh_jti IS NOT NULL "
+                    "AND last_refresh_jti_new IS NULL"
+                ),
+                {"lo": lo, "hi": lo + BACKFILL_CHUNK_SIZE - 1},
+            )
+
+        # Unique indexes for the new column, attached to the swapped column below
+        for name in ("ix_refresh_tokens_jti_new", "refresh_tokens_jti_key_new"):
+            drop_index_if_invalid(name)
+            op.create_index(
+                name, "refresh_tokens", ["jti_new"], unique=True,
+                postgresql_concurrently=True, if_not_exists=True,
+            )
+
+    # Swap. EXCLUSIVE mode blocks writers but not readers while rows written during
+    # the backfill are caught up. last_refresh_jti changes on every login and refresh,
+    # so it is compared rather than only filled where still NULL.
+    op.execute("LOCK TABLE users, refresh_tokens IN EXCLUSIVE MODE")
+    op.execute("UPDATE refresh_tokens SET jti_new = jti::uuid WHERE jti_new IS NULL")
+    op.execute(
+        "UPDATE users SET last_refresh_jti_new = last_refresh_jti::uuid "
+        "WHERE last_refresh_jti_new IS DISTINCT FROM last_refresh_jti::uuid"
+    )
+    # Dropping the old columns also drops their index and unique constraint
+    op.drop_column("refresh_tokens", "jti")
+    op.alter_column("refresh_tokens", "jti_new", new_column_name="jti", nullable=False)
+    op.execute("ALTER INDEX ix_refresh_tokens_jti_new RENAME TO ix_refresh_tokens_jti")
+    op.execute(
+        "ALTER TABLE refresh_tokens ADD CONSTRAINT refresh_tokens_jti_key "
+        "UNIQUE USING INDEX refresh_tokens_jti_key_new"
+    )
+    op.drop_column("users", "last_refresh_jti")
+    op.alter_column("users", "last_refresh_jti_new", new_column_name="last_refresh_jti")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.alter_column(
+        "users",
+        "last_refresh_jti",
+        type_=sa.String(length=64),
+        existing_type=psql.UUID(as_uuid=True),
+        postgresql_using="last_refresh_jti::text",
+        existing_nullable=True,
+    )
+    op.alter_column(
+        "refresh_tokens",
+        "jti",
+        type_=sa.String(length=64),
+        existing_type=psql.UUID(as_uuid=True),
+        postgresql_using="jti::text",
+        existing_nullable=False,
+    )
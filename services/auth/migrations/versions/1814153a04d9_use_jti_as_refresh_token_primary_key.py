@@ -0,0 +1,39 @@
+"""Use jti as the refresh_tokens primary key
+
+Revision ID: 1814153a04d9
+Revises: ea07e60dc391
+Create Date: 2026-10-16 00:23:21.834194
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1814153a04d9'
+down_revision: Union[str, None] = 'ea07e60dc391'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The primary key index on jti replaces both the surrogate id key and the unique jti index
+    op.drop_constraint('refresh_tokens_pkey', 'refresh_tokens', type_='primary')
+    op.drop_column('refresh_tokens', 'id')
+    op.drop_index('ix_refresh_tokens_jti', table_name='refresh_tokens')
+    op.create_primary_key('refresh_tokens_pkey', 'refresh_tokens', ['jti'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('refresh_tokens_pkey', 'refresh_tokens', type_='primary')
+    op.create_index('ix_refresh_tokens_jti', 'refresh_tokens', ['jti'], unique=True)
+    op.add_column(
+        'refresh_tokens',
+        sa.Column('id', sa.String(), nullable=False, server_default=sa.text('gen_random_uuid()::text')),
+    )
+    op.alter_column('refresh_tokens', 'id', server_default=None)
+    op.create_primary_key('refresh_tokens_pkey', 'refresh_tokens', ['id'])
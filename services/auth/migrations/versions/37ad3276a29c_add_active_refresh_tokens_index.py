@@ -0,0 +1,46 @@
+"""Add partial index on active refresh tokens per user
+
+Revision ID: 37ad3276a29c
+Revises: 7147f127b477
+Create Date: 2026-10-15 22:40:12.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import drop_index_if_invalid
+
+
+# revision identifiers, used by Alembic.
+revision: str = '37ad3276a29c'
+down_revision: Union[str, None] = '7147f127b477'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # jti lookups already use the unique ix_refresh_tokens_jti; this covers the
+    # per-user queries (logout revocation, listing valid tokens) and skips dead rows.
+    # CONCURRENTLY keeps logins inserting refresh tokens during the build
+    with op.get_context().autocommit_block():
+        drop_index_if_invalid("ix_refresh_tokens_user_active_expires")
+        op.create_index(
+            "ix_refresh_tokens_user_active_expires",
+            "refresh_tokens",
+            ["user_id", "expires_at"],
+            postgresql_where=sa.text("is_active"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_refresh_tokens_user_active_expires", table_name="refresh_tokens",
+            postgresql_concurrently=True, if_exists=True,
+        )
@@ -18,25 +18,51 @@ down_revision: Union[str, None] = '5de54a12606d'
 branch_labels: Union[str, Sequence[str], None] = None
 depends_on: Union[str, Sequence[str], None] = None
 
+# Rows per committed batch when backfilling the enum column
+BACKFILL_CHUNK_SIZE = 1000
+
 # Define the enum separately
 user_role_enum = psql.ENUM('user', 'admin', 'guest', name='userrole', create_type=False)
 
 
 def upgrade() -> None:
     """Upgrade schema."""
-    # 1. Create enum type
-    user_role_enum.create(op.get_bind(), checkfirst=True)
+    # 1. Create enum type. Several containers may run migrations at startup; the
+    # transaction-scoped advisory lock makes the existence check and CREATE TYPE atomic
+    # across them. The key is hashed in SQL because Python's str hash differs per process.
+    bind = op.get_bind()
+    bind.execute(sa.text("SELECT pg_advisory_xact_lock(hashtext('userrole'))"))
+    user_role_enum.create(bind, checkfirst=True)
 
-    # 2. Alter the column type
-    op.alter_column(
-        'users',
-        'role',
-        type_=user_role_enum,
-        existing_type=sa.String(length=50),
-        postgresql_using='role::userrole',
-        existing_nullable=False
-    )
-    # ### end Alembic commands ###
+    # 2. Convert users.role by column swap instead of an in-place ALTER ... TYPE, which
+    # rewrites the table under ACCESS EXCLUSIVE. Add the new nullable column (catalog only)
+    op.add_column('users', sa.Column('role_new', user_role_enum, nullable=True), if_not_exists=True)
+
+    # 3. Backfill in id ranges, each batch committed on its own, so no long-running
+    # transaction holds locks on users while the table is copied.
+    # This makes the revision non-atomic: entering the block commits everything so far
+    # (including earlier revisions of this run, with their version stamps) and releases
+    # the advisory lock, which only had to cover CREATE TYPE. Steps 1-3 are therefore
+    # idempotent, so a run that fails later can simply be repeated. Step 4 commits
+    # together with this revision's version stamp, so it is never left half-applied.
+    with op.get_context().autocommit_block():
+        max_id = bind.execute(sa.text("SELECT max(id) FROM users")).scalar() or 0
+        for lo in range(0, max_id + 1, BACKFILL_CHUNK_SIZE):
+            bind.execute(
+                sa.text(
+                    "UPDATE users SET role_new = role::userrole "
+                    "WHERE id BETWEEN :lo AND :hi AND role_new IS NULL"
+                ),
+                {"lo": lo, "hi": lo + BACKFILL_CHUNK_SIZE - 1},
+            )
+
+    # 4. Swap. EXCLUSIVE mode blocks writers but not readers while rows written during
+    # the backfill are caught up; only the final catalog changes need ACCESS EXCLUSIVE
+    op.execute("LOCK TABLE users IN EXCLUSIVE MODE")
+    # Compare rather than only fill NULLs: roles can change after their batch was copied
+    op.execute("UPDATE users SET role_new = role::userrole WHERE role_new IS DISTINCT FROM role::userrole")
+    op.drop_column('users', 'role')
+    op.alter_column('users', 'role_new', new_column_name='role', nullable=False)
 
 
 def downgrade() -> None:
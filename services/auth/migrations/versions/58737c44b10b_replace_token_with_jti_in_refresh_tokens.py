@@ -8,7 +8,8 @@ Create Date: 2025-06-14 10:43:35.280191
 from typing import Sequence, Union
 
 from alembic import op
-import sqlalchemy as sa
+
+from migrations.helpers import drop_index_if_invalid
 
 
 # revision identifiers, used by Alembic.
@@ -20,15 +21,32 @@ depends_on: Union[str, Sequence[str], None] = None
 
 def upgrade() -> None:
     """Upgrade schema."""
-    op.drop_index("ix_refresh_tokens_token", table_name="refresh_tokens")
-    op.drop_column("refresh_tokens", "token")
-    op.add_column("refresh_tokens", sa.Column("jti", sa.String(length=64), nullable=False, unique=True))
-    op.create_index("ix_refresh_tokens_jti", "refresh_tokens", ["jti"], unique=True)
+    # The autocommit block below commits these column changes before the index build, so
+    # each step is idempotent and a run whose concurrent build failed can be repeated
+    op.drop_index("ix_refresh_tokens_token", table_name="refresh_tokens", if_exists=True)
+    op.drop_column("refresh_tokens", "token", if_exists=True)
+    op.execute(
+        "ALTER TABLE refresh_tokens ADD COLUMN IF NOT EXISTS "
+        "jti VARCHAR(64) NOT NULL CONSTRAINT refresh_tokens_jti_key UNIQUE"
+    )
+    # CONCURRENTLY builds the index without blocking inserts (logins keep writing
+    # refresh tokens); it cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        drop_index_if_invalid("ix_refresh_tokens_jti")
+        op.create_index(
+            "ix_refresh_tokens_jti", "refresh_tokens", ["jti"], unique=True,
+            postgresql_concurrently=True, if_not_exists=True,
+        )
 
 
 def downgrade() -> None:
     """Downgrade schema."""
-    op.drop_index("ix_refresh_tokens_jti", table_name="refresh_tokens")
-    op.drop_column("refresh_tokens", "jti")
-    op.add_column("refresh_tokens", sa.Column("token", sa.String(), nullable=False))
-    op.create_index("ix_refresh_tokens_token", "refresh_tokens", ["token"], unique=True)
\ No newline at end of file
+    op.drop_index("ix_refresh_tokens_jti", table_name="refresh_tokens", if_exists=True)
+    op.drop_column("refresh_tokens", "jti", if_exists=True)
+    op.execute("ALTER TABLE refresh_tokens ADD COLUMN IF NOT EXISTS token VARCHAR NOT NULL")
+    with op.get_context().autocommit_block():
+        drop_index_if_invalid("ix_refresh_tokens_token")
+        op.create_index(
+            "ix_refresh_tokens_token", "refresh_tokens", ["token"], unique=True,
+            postgresql_concurrently=True, if_not_exists=True,
+        )
@@ -18,10 +18,46 @@ branch_labels: Union[str, Sequence[str], None] = None
 depends_on: Union[str, Sequence[str], None] = None
 
 
+# Rows per committed batch when backfilling existing users
+BACKFILL_CHUNK_SIZE = 1000
+
+
 def upgrade() -> None:
     """Upgrade schema."""
-    op.add_column('users', sa.Column('role', sa.String(length=50), nullable=False, server_default='user'))
-    op.alter_column('users', 'role', server_default=None)
+    # Add the column nullable and without a default, which never rewrites the table.
+    # The default set afterwards only applies to rows inserted from now on.
+    op.add_column('users', sa.Column('role', sa.String(length=50), nullable=True), if_not_exists=True)
+    op.alter_column('users', 'role', server_default='user')
+
+    # Backfill existing rows in id ranges, each batch committed on its own.
+    # The autocommit blocks make this revision non-atomic: each one commits the work
+    # before it, so every step up to the VALIDATE is idempotent and a failed run can
+    # simply be repeated. The final SET NOT NULL commits with the version stamp.
+    bind = op.get_bind()
+    with op.get_context().autocommit_block():
+        max_id = bind.execute(sa.text("SELECT max(id) FROM users")).scalar() or 0
+        for lo in range(0, max_id + 1, BACKFILL_CHUNK_SIZE):
+            bind.execute(
+                sa.text("UPDATE users SET role = 'user' WHERE id BETWEEN :lo AND :hi AND role IS NULL"),
+                {"lo": lo, "hi": lo + BACKFILL_CHUNK_SIZE - 1},
+            )
+
+    # NOT VALID skips the scan; VALIDATE then scans under SHARE UPDATE EXCLUSIVE, which
+    # does not block reads or writes. With the check validated, SET NOT NULL (PG 12+)
+    # trusts it instead of scanning the table again under ACCESS EXCLUSIVE.
+    # A previous failed run may already have committed the constraint
+    constraint_exists = bind.execute(
+        sa.text(
+            "SELECT 1 FROM pg_constraint "
+            "WHERE conname = 'users_role_not_null' AND conrelid = 'users'::regclass"
+        )
+    ).first()
+    if constraint_exists is None:
+        op.execute("ALTER TABLE users ADD CONSTRAINT users_role_not_null CHECK (role IS NOT NULL) NOT VALID")
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TABLE users VALIDATE CONSTRAINT users_role_not_null")
+    op.alter_column('users', 'role', nullable=False, server_default=None)
+    op.drop_constraint('users_role_not_null', 'users', type_='check')
 
 
 def downgrade() -> None:
@@ -0,0 +1,32 @@
+"""Drop the lower(email) index left by earlier versions of b4ba0f66460d
+
+Revision ID: 906e7b8fb4c7
+Revises: 10e7c3465815
+Create Date: 2026-10-16 00:08:49.182808
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '906e7b8fb4c7'
+down_revision: Union[str, None] = '10e7c3465815'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Emails are lowercased in b4ba0f66460d. Databases that ran an earlier version of
+    # that revision built a unique lower(email) index instead; normalize them the same
+    # way (lower(email) was unique there, so this cannot collide) and drop the index.
+    # On other databases both statements are no-ops.
+    op.execute("UPDATE users SET email = lower(email) WHERE email <> lower(email)")
+    op.drop_index("ix_users_email_lower", table_name="users", if_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    pass
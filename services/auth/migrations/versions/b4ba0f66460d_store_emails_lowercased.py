@@ -0,0 +1,31 @@
+"""Store emails lowercased
+
+Revision ID: b4ba0f66460d
+Revises: 37ad3276a29c
+Create Date: 2026-10-15 22:51:37.402915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4ba0f66460d'
+down_revision: Union[str, None] = '37ad3276a29c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The app normalizes emails on write, so lowercasing the existing rows lets the
+    # unique email index enforce case-insensitive uniqueness without a second index.
+    # Fails on the unique email index if two accounts differ only by case; merge them first.
+    op.execute("UPDATE users SET email = lower(email) WHERE email <> lower(email)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # The original casing is not kept, so there is nothing to restore
+    pass
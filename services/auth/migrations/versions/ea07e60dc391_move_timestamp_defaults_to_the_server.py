@@ -0,0 +1,35 @@
+"""Move timestamp defaults to the server
+
+Revision ID: ea07e60dc391
+Revises: 906e7b8fb4c7
+Create Date: 2026-10-16 00:21:19.927328
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ea07e60dc391'
+down_revision: Union[str, None] = '906e7b8fb4c7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # users.created_at already defaults to now() (a206b3f11909)
+    op.alter_column('users', 'updated_at', server_default=sa.text('now()'))
+    op.alter_column('refresh_tokens', 'created_at', server_default=sa.text('now()'))
+    op.alter_column(
+        'refresh_tokens', 'expires_at', server_default=sa.text("now() + interval '7 days'")
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.alter_column('refresh_tokens', 'expires_at', server_default=None)
+    op.alter_column('refresh_tokens', 'created_at', server_default=None)
+    op.alter_column('users', 'updated_at', server_default=None)
@@ -0,0 +1,44 @@
+"""Add reverse(email) index to users for domain suffix matches
+
+Revision ID: eb127b918d2d
+Revises: 10f0a485e4d1
+Create Date: 2026-10-15 23:32:39.679968
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import drop_index_if_invalid
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'eb127b918d2d'
+down_revision: Union[str, None] = '10f0a485e4d1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # text_pattern_ops lets LIKE 'prefix%' on the reversed email use the B-tree.
+    # CONCURRENTLY keeps registrations and logins writing users during the build
+    with op.get_context().autocommit_block():
+        drop_index_if_invalid("ix_users_email_reversed")
+        op.create_index(
+            "ix_users_email_reversed",
+            "users",
+            [sa.text("reverse(email) text_pattern_ops")],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_users_email_reversed", table_name="users",
+            postgresql_concurrently=True, if_exists=True,
+        )
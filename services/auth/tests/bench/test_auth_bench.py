@@ -0,0 +1,38 @@
+"""
+Latency benchmarks for the auth hot paths.
+
+Run with `poetry run pytest tests/bench --benchmark-only`; compare against a saved run with
+`--benchmark-compare --benchmark-compare-fail=mean:10%` to catch regressions on the login path.
+"""
+
+import asyncio
+import pytest
+import pytest_asyncio
+from app.limiter import reset_rate_limits
+
+pytest.importorskip("pytest_benchmark")
+
+
+@pytest_asyncio.fixture
+async def event_loop_ref():
+    """The loop the async fixtures run on, so a sync benchmark can drive requests on it."""
+    return asyncio.get_running_loop()
+
+
+@pytest.mark.benchmark(group="login")
+def test_login_bench(benchmark, event_loop_ref, client, fresh_user):
+    """End-to-end latency of POST /api/v1/token for an existing user."""
+    email, password = fresh_user
+
+    async def login():
+        res = await client.post("/api/v1/token", data={"username": email, "password": password})
+        assert res.status_code == 200
+
+    # Reset the rate limiters outside the timed call, so every round stays on the
+    # success path rather than the 429 one
+    benchmark.pedantic(
+        lambda: event_loop_ref.run_until_complete(login()),
+        setup=reset_rate_limits,
+        rounds=100,
+        warmup_rounds=5,
+    )
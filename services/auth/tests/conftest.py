@@ -1,62 +1,198 @@
 import os
+# Minimum bcrypt cost keeps password hashing from dominating the suite's runtime;
+# set before any app module reads its settings
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+# Record every trace so tracing tests see their spans
+os.environ.setdefault("OTEL_TRACES_SAMPLER_ARG", "1.0")
 from dotenv import load_dotenv
 import pytest
 import pytest_asyncio
+import base64
+import itertools
+import json
+import re
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy import text
-from sqlalchemy.pool import NullPool
 from app.db.base import Base
 from app.main import app
-from app.db.session import get_db
+from app.db.session import get_db, get_sessionmaker
+from app.services.auth import invalidate_cached_user, invalidate_user_credentials
 from httpx import AsyncClient, ASGITransport
+import orjson
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from typing import cast
 import os
-# Load environment before engine is created
-
-env = os.getenv("ENV", "local")
-if env == "docker":
-    load_dotenv(".env.test.docker")
-else:
-    load_dotenv(".env.test")
+# Load environment before engine is created; CI that already exports the test
+# settings skips reading the file
+if not os.getenv("TEST_DATABASE_URL"):
+    env = os.getenv("ENV", "local")
+    if env == "docker":
+        load_dotenv(".env.test.docker")
+    else:
+        load_dotenv(".env.test")
 
 DATABASE_URL = os.getenv("TEST_DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("TEST_DATABASE_URL environment variable is not set")
 
-engine_test = create_async_engine(
-    DATABASE_URL,
-    echo=False,
-    future=True,
-    poolclass=NullPool,
+# Under pytest-xdist each worker gets its own schema, so workers never share tables
+XDIST_WORKER = os.getenv("PYTEST_XDIST_WORKER")
+TEST_SCHEMA = f"test_{XDIST_WORKER}" if XDIST_WORKER else None
+
+# Every table in one statement, so clearing them is a single round-trip
+_TRUNCATE_SQL = text(
+    "TRUNCATE TABLE "
+    + ", ".join(f'"{table.name}"' for table in reversed(Base.metadata.sorted_tables))
+    + " RESTART IDENTITY CASCADE"
 )
-TestingSessionLocal = async_sessionmaker(bind=engine_test, expire_on_commit=False)
 
-@pytest_asyncio.fixture(scope="session", autouse=True)
-async def setup_db():
+@pytest.fixture(scope="session")
+def engine_test():
+    """
+    Test engine, created on first use so runs that never touch the database skip it.
+    A small pool keeps connections (and their prepared statements) warm across tests.
+    """
+    return create_async_engine(
+        DATABASE_URL,
+        echo=False,
+        future=True,
+        pool_size=5,
+        max_overflow=10,
+        pool_pre_ping=False,
+        connect_args={"server_settings": {"search_path": TEST_SCHEMA}} if TEST_SCHEMA else {},
+    )
+
+@pytest_asyncio.fixture(scope="session")
+async def setup_db(engine_test):
     async with engine_test.begin() as conn:
+        if TEST_SCHEMA:
+            await conn.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{TEST_SCHEMA}"'))
         await conn.run_sync(Base.metadata.create_all)
+        # Start the run from empty tables; tests themselves never commit to the database
+        await conn.execute(_TRUNCATE_SQL)
     yield
+    await engine_test.dispose()
 
 @pytest_asyncio.fixture
-async def db_session(setup_db):
-    async with TestingSessionLocal() as session:
-        # Clear tables before each test
-        await session.execute(text("SET session_replication_role = 'replica';"))
-        for table in reversed(Base.metadata.sorted_tables):
-            await session.execute(text(f'TRUNCATE TABLE "{table.name}" RESTART IDENTITY CASCADE;'))
-        await session.execute(text("SET session_replication_role = 'origin';"))
-        await session.commit()
+async def session_factory(engine_test, setup_db):
+    """
+    Session factory bound to a single connection inside a transaction that is rolled back
+    when the test ends. Commits made by the app or the test only release a SAVEPOINT,
+    so nothing a test writes outlives it.
+    """
+    async with engine_test.connect() as conn:
+        trans = await conn.begin()
+        yield async_sessionmaker(
+            bind=conn, expire_on_commit=False, join_transaction_mode="create_savepoint"
+        )
+        await trans.rollback()
+
+@pytest_asyncio.fixture
+async def db_session(session_factory):
+    # Rolled-back rows are gone, so per-worker caches must not outlive the test either
+    invalidate_cached_user()
+    invalidate_user_credentials()
+    # Tests drive this session with explicit statements and commits, so autoflush would only
+    # scan an identity map with nothing pending. App sessions keep the production default.
+    async with session_factory(autoflush=False) as session:
         yield session
 
+class _OrjsonClient(AsyncClient):
+    """AsyncClient that encodes `json=` request bodies with orjson, like the app's responses."""
+
+    def build_request(self, method, url, *, json=None, headers=None, **kwargs):
+        if json is not None:
+            kwargs["content"] = orjson.dumps(json)
+            headers = {**(headers or {}), "Content-Type": "application/json"}
+        return super().build_request(method, url, headers=headers, **kwargs)
+
+@pytest_asyncio.fixture(scope="session")
+async def http_client():
+    """One transport and client for the whole run; per-test state is reset by `client`."""
+    transport = ASGITransport(app=app)
+    async with _OrjsonClient(transport=transport, base_url="http://testserver") as http_client:
+        yield http_client
+
 @pytest_asyncio.fixture
-async def client(db_session):
+async def client(http_client, db_session, session_factory):
     async def override_get_db():
-        async with TestingSessionLocal() as session:
+        async with session_factory() as session:
             yield session
     app.dependency_overrides[get_db] = override_get_db
-    transport = ASGITransport(app=app)
-    async with AsyncClient(transport=transport, base_url="http://testserver") as client:
-        yield client
+    app.dependency_overrides[get_sessionmaker] = lambda: session_factory
+    yield http_client
     app.dependency_overrides.clear()
+    # Cookies set by one test's logins must not authenticate the next test
+    http_client.cookies.clear()
+
+@pytest_asyncio.fixture
+async def client_no_db(http_client):
+    """
+    Client for tests that never reach storage (request validation, malformed tokens).
+    get_db yields nothing, so these tests skip the per-test connection and transaction.
+    """
+    async def override_get_db():
+        yield None
+    app.dependency_overrides[get_db] = override_get_db
+    yield http_client
+    app.dependency_overrides.clear()
+    http_client.cookies.clear()
+
+@pytest.fixture
+def unique_email(request):
+    """
+    Return a factory of emails unique within the test: the test's name plus a counter.
+    Each test's rows are rolled back, so uniqueness only has to hold per test.
+    """
+    prefix = re.sub(r"[^a-z0-9_]", "_", request.node.name.lower())[:48]
+    counter = itertools.count()
+    return lambda domain="example.com": f"{prefix}_{next(counter)}@{domain}"
+
+@pytest_asyncio.fixture
+async def fresh_user(client, unique_email):
+    """Register a new user and return its (email, password)."""
+    email = unique_email()
+    password = "testpassword"
+    res = await client.post("/api/v1/users/", json={"email": email, "password": password})
+    assert res.status_code == 200
+    return email, password
+
+@pytest_asyncio.fixture
+async def logged_in_tokens(client, fresh_user):
+    """Log fresh_user in and return its tokens as {"access": ..., "refresh": ...}."""
+    email, password = fresh_user
+    res = await client.post("/api/v1/token", data={"username": email, "password": password})
+    assert res.status_code == 200
+    return {"access": res.json()["access_token"], "refresh": res.json()["refresh_token"]}
+
+@pytest.fixture(scope="module")
+def tampered_token_factory():
+    """Return a function that rewrites a JWT's `sub` claim while keeping the original signature."""
+    def make(token: str) -> str:
+        header, payload_b64, signature = token.split(".")
+        payload = json.loads(base64.urlsafe_b64decode(payload_b64 + "=="))
+        payload["sub"] = "hacker@example.com"
+        new_payload = base64.urlsafe_b64encode(
+            json.dumps(payload, separators=(",", ":")).encode()
+        ).rstrip(b"=").decode()
+        return f"{header}.{new_payload}.{signature}"
+    return make
+
+@pytest.fixture(scope="session")
+def _session_span_exporter():
+    """In-memory exporter registered once on the app's tracer provider."""
+    exporter = InMemorySpanExporter()
+    cast(TracerProvider, trace.get_tracer_provider()).add_span_processor(SimpleSpanProcessor(exporter))
+    return exporter
+
+@pytest.fixture
+def span_exporter(_session_span_exporter):
+    """The shared span exporter, emptied so a test only sees its own spans."""
+    _session_span_exporter.clear()
+    return _session_span_exporter
 
 @pytest.fixture(scope="session")
 def anyio_backend():
@@ -1,20 +1,16 @@
 import re
 import uuid
 import pytest
-import asyncio
 import time
 import logging
-from jose import jwt, JWTError
+import jwt
 from unittest.mock import patch
-from app.core.config import get_settings
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import SimpleSpanProcessor
-from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
-from opentelemetry import trace
-from typing import cast
 
 
-settings = get_settings()
+# Counter samples that must have been incremented at least once
+_REGISTRATIONS_RE = re.compile(r'app_user_registrations_total\{method="password"\} [1-9][0-9]*\.0')
+_LOGINS_RE = re.compile(r'app_user_logins_total\{method="password"\} [1-9][0-9]*\.0')
+_REFRESHES_RE = re.compile(r'app_refresh_token_usage_total\{method="refresh"\} [1-9][0-9]*\.0')
 
 @pytest.mark.asyncio
 async def test_example(client):
@@ -24,9 +20,9 @@ async def test_example(client):
     assert response.json() == {"status": "ok"}
 
 @pytest.mark.asyncio
-async def test_register_user(client):
+async def test_register_user(client, unique_email):
     """Register a new user with valid credentials."""
-    email = f"newuser_{uuid.uuid4()}@example.com"
+    email = unique_email()
     response = await client.post("/api/v1/users/", json={
         "email": email,
         "password": "newpassword"
@@ -35,70 +31,110 @@ async def test_register_user(client):
     assert response.json()["email"] == email
 
 @pytest.mark.asyncio
-async def test_login_success(client):
+async def test_login_success(client, fresh_user):
     """Login succeeds with correct credentials and sets cookies."""
-    email = f"testuser_{uuid.uuid4()}@example.com"
-    await client.post("/api/v1/users/", json={"email": email, "password": "testpassword"})
-    response = await client.post("/api/v1/token", data={"username": email, "password": "testpassword"})
+    email, password = fresh_user
+    response = await client.post("/api/v1/token", data={"username": email, "password": password})
     assert response.status_code == 200
     assert "access_token" in response.cookies
     assert "refresh_token" in response.cookies
 
 @pytest.mark.asyncio
-async def test_protected_endpoint_requires_cookie(client):
+async def test_login_records_refresh_token(logged_in_tokens, db_session):
+    """Login stores the issued refresh token's JTI once the response has been sent."""
+    from sqlalchemy import text
+    jti = jwt.decode(logged_in_tokens["refresh"], options={"verify_signature": False})["jti"]
+    result = await db_session.execute(
+        text("SELECT is_active FROM refresh_tokens WHERE jti = :jti"), {"jti": uuid.UUID(jti)}
+    )
+    assert result.scalar_one() is True
+
+@pytest.mark.asyncio
+async def test_late_refresh_token_record_after_logout_is_inactive(client, db_session, fresh_user):
+    """A login's token record written after the user has logged out is stored inactive."""
+    from sqlalchemy import text
+    from app.services.refresh_tokens import persist_refresh_token
+    email, password = fresh_user
+    # Hold the login's background write back until after the logout
+    queued = []
+    async def hold(*args):
+        queued.append(args)
+    with patch("app.api.v1.users.persist_refresh_token", hold):
+        login_res = await client.post("/api/v1/token", data={"username": email, "password": password})
+    assert login_res.status_code == 200
+    client.cookies.set("access_token", login_res.json()["access_token"])
+    assert (await client.post("/api/v1/logout")).status_code == 204
+
+    await persist_refresh_token(*queued[0])
+    _, jti, user_id, _ = queued[0]
+    result = await db_session.execute(
+        text("SELECT count(*) FROM refresh_tokens WHERE user_id = :user_id AND is_active"),
+        {"user_id": user_id},
+    )
+    assert result.scalar_one() == 0
+    result = await db_session.execute(
+        text("SELECT is_active FROM refresh_tokens WHERE jti = :jti"), {"jti": jti}
+    )
+    assert result.scalar_one() is False
+
+@pytest.mark.asyncio
+async def test_create_refresh_tokens_bulk(client, db_session, unique_email):
+    """Bulk insert stores every record once and skips JTIs that already exist."""
+    from datetime import datetime, timedelta, timezone
+    from sqlalchemy import text
+    from app.services.refresh_tokens import create_refresh_tokens_bulk
+    email = unique_email()
+    user_id = (await client.post("/api/v1/users/", json={"email": email, "password": "pw"})).json()["id"]
+    expires_at = datetime.now(timezone.utc) + timedelta(days=1)
+    rows = [{"jti": uuid.uuid4(), "user_id": user_id, "expires_at": expires_at} for _ in range(50)]
+    await create_refresh_tokens_bulk(db_session, rows)
+    await create_refresh_tokens_bulk(db_session, rows[:10])
+    await db_session.commit()
+    result = await db_session.execute(
+        text("SELECT count(*) FROM refresh_tokens WHERE user_id = :user_id AND is_active"),
+        {"user_id": user_id},
+    )
+    assert result.scalar_one() == 50
+
+@pytest.mark.asyncio
+async def test_protected_endpoint_requires_cookie(client, logged_in_tokens):
     """Protected endpoint requires access_token cookie."""
-    email = f"cookieuser_{uuid.uuid4()}@example.com"
-    await client.post("/api/v1/users/", json={"email": email, "password": "pw"})
-    login_res = await client.post("/api/v1/token", data={"username": email, "password": "pw"})
-    access_token = login_res.cookies.get("access_token")
-    client.cookies.set("access_token", access_token)
+    client.cookies.set("access_token", logged_in_tokens["access"])
     res = await client.get("/api/v1/me")
     assert res.status_code == 200
 
 @pytest.mark.asyncio
-async def test_refresh_token_success(client):
+async def test_refresh_token_success(client, logged_in_tokens):
     """Refresh token endpoint returns new access token on valid refresh."""
-    email = f"testuser_{uuid.uuid4()}@example.com"
-    await client.post("/api/v1/users/", json={"email": email, "password": "testpassword"})
-    login_res = await client.post("/api/v1/token", data={"username": email, "password": "testpassword"})
-    refresh_token = login_res.cookies.get("refresh_token")
-    refresh_res = await client.post("/api/v1/refresh", json={"refresh_token": refresh_token})
+    refresh_res = await client.post("/api/v1/refresh", json={"refresh_token": logged_in_tokens["refresh"]})
     assert refresh_res.status_code == 200
     assert "access_token" in refresh_res.cookies
 
 @pytest.mark.asyncio
-async def test_logout_revokes_refresh_token(client):
+async def test_logout_revokes_refresh_token(client, logged_in_tokens):
     """Logout revokes refresh token and prevents its reuse."""
-    email = f"logoutuser_{uuid.uuid4()}@example.com"
-    password = "logoutpassword"
-    await client.post("/api/v1/users/", json={"email": email, "password": password})
-    login_res = await client.post("/api/v1/token", data={"username": email, "password": password})
-    access_token = login_res.cookies.get("access_token")
-    refresh_token = login_res.cookies.get("refresh_token")
-    client.cookies.set("access_token", access_token)
+    client.cookies.set("access_token", logged_in_tokens["access"])
     logout_res = await client.post("/api/v1/logout")
     assert logout_res.status_code == 204
-    refresh_res = await client.post("/api/v1/refresh", json={"refresh_token": refresh_token})
+    refresh_res = await client.post("/api/v1/refresh", json={"refresh_token": logged_in_tokens["refresh"]})
     assert refresh_res.status_code == 401
+    assert refresh_res.json().get("detail") == "Refresh token invalid or reused"
 
 @pytest.mark.asyncio
-async def test_login_invalid_password(client):
-    """Login fails with incorrect password."""
-    email = f"testuser_{uuid.uuid4()}@example.com"
-    await client.post("/api/v1/users/", json={
-        "email": email,
-        "password": "testpassword"
-    })
+@pytest.mark.parametrize("wrong_password", ["wrongpassword", "incorrectpassword"])
+async def test_login_wrong_password(client, fresh_user, wrong_password):
+    """Login fails with an incorrect password."""
+    email, _ = fresh_user
     response = await client.post("/api/v1/token", data={
         "username": email,
-        "password": "wrongpassword"
+        "password": wrong_password
     })
     assert response.status_code == 401
 
 @pytest.mark.asyncio
-async def test_register_duplicate_user(client):
+async def test_register_duplicate_user(client, unique_email):
     """Registering with an existing email fails."""
-    email = f"dupuser_{uuid.uuid4()}@example.com"
+    email = unique_email()
     payload = {"email": email, "password": "password123"}
     res1 = await client.post("/api/v1/users/", json=payload)
     assert res1.status_code in (200, 201)
@@ -106,63 +142,83 @@ async def test_register_duplicate_user(client):
     assert res2.status_code in (400, 409)
 
 @pytest.mark.asyncio
-async def test_register_invalid_email_format(client):
+async def test_register_duplicate_user_different_case(client, unique_email):
+    """Emails are unique case-insensitively, and login ignores case."""
+    email = unique_email()
+    res1 = await client.post("/api/v1/users/", json={"email": email, "password": "password123"})
+    assert res1.status_code in (200, 201)
+    res2 = await client.post("/api/v1/users/", json={"email": email.upper(), "password": "password123"})
+    assert res2.status_code in (400, 409)
+    login_res = await client.post("/api/v1/token", data={"username": email.upper(), "password": "password123"})
+    assert login_res.status_code == 200
+
+@pytest.mark.asyncio
+@pytest.mark.no_db
+async def test_register_invalid_email_format(client_no_db):
     """Registering with an invalid email format fails."""
-    response = await client.post("/api/v1/users/", json={
+    response = await client_no_db.post("/api/v1/users/", json={
         "email": "not-an-email",
         "password": "somepassword"
     })
     assert response.status_code in (400, 422)
 
 @pytest.mark.asyncio
-async def test_login_wrong_password(client):
-    """Login fails with wrong password."""
-    email = f"wrongpass_{uuid.uuid4()}@example.com"
-    await client.post("/api/v1/users/", json={
-        "email": email,
-        "password": "correctpassword"
-    })
-    response = await client.post("/api/v1/token", data={
-        "username": email,
-        "password": "incorrectpassword"
-    })
-    assert response.status_code == 401
-
-@pytest.mark.asyncio
-async def test_refresh_token_invalid_token(client):
+@pytest.mark.no_db
+async def test_refresh_token_invalid_token(client_no_db):
     """Invalid refresh token is rejected."""
     invalid_token = "this.is.not.a.valid.token"
-    res = await client.post("/api/v1/refresh", json={"refresh_token": invalid_token})
+    res = await client_no_db.post("/api/v1/refresh", json={"refresh_token": invalid_token})
+    assert res.status_code == 401
+    assert res.json().get("detail") == "Invalid refresh token"
+
+@pytest.mark.asyncio
+async def test_refresh_rejects_access_token(client, logged_in_tokens):
+    """An access token (no jti/iat claims) cannot be used as a refresh token."""
+    res = await client.post("/api/v1/refresh", json={"refresh_token": logged_in_tokens["access"]})
     assert res.status_code == 401
     assert res.json().get("detail") == "Invalid refresh token"
 
 @pytest.mark.asyncio
-async def test_refresh_token_missing_token(client):
+@pytest.mark.no_db
+async def test_refresh_token_missing_token(client_no_db):
     """Missing refresh token in request is rejected."""
-    res = await client.post("/api/v1/refresh", json={})
+    res = await client_no_db.post("/api/v1/refresh", json={})
     assert res.status_code in (400, 422)
 
 @pytest.mark.asyncio
-async def test_refresh_token_expired_token(client):
-    """Refresh token is invalid after logout (simulate expiry/revocation)."""
-    email = f"expireduser_{uuid.uuid4()}@example.com"
-    password = "expiredpassword"
-    await client.post("/api/v1/users/", json={"email": email, "password": password})
-    login_res = await client.post("/api/v1/token", data={"username": email, "password": password})
-    refresh_token = login_res.json()["refresh_token"]
+async def test_refresh_rate_limited(client):
+    """Refresh endpoint returns 429 once a client exceeds its per-minute budget."""
+    from app.limiter import reset_rate_limits
+    reset_rate_limits()
+    # Freeze the limiter's clock so no tokens refill while the loop runs, however slowly
+    try:
+        with patch("app.limiter.time.monotonic", return_value=time.monotonic()):
+            for _ in range(100):
+                res = await client.post("/api/v1/refresh", json={"refresh_token": "not-a-jwt"})
+                assert res.status_code == 401
+            res = await client.post("/api/v1/refresh", json={"refresh_token": "not-a-jwt"})
+            assert res.status_code == 429
+            assert "Retry-After" in res.headers
+    finally:
+        reset_rate_limits()
 
-    access_token = login_res.json()["access_token"]
-    await client.post("/api/v1/logout", headers={"Authorization": f"Bearer {access_token}"})
-    # ...assert expired/invalid refresh token here if needed...
+@pytest.mark.asyncio
+async def test_refresh_token_expired_token(client, logged_in_tokens):
+    """A refresh token past its exp claim is rejected as expired."""
+    from app.core.security import create_refresh_token
+    claims = jwt.decode(logged_in_tokens["refresh"], options={"verify_signature": False})
+    # Re-sign the issued token's claims with an exp one second before its iat
+    expired_token = create_refresh_token(
+        {"sub": claims["sub"], "jti": claims["jti"], "iat": claims["iat"]}, expires_in=-1
+    )
+    res = await client.post("/api/v1/refresh", json={"refresh_token": expired_token})
+    assert res.status_code == 401
+    assert res.json().get("detail") == "Refresh token expired"
 
 @pytest.mark.asyncio
-async def test_refresh_token_double_use(client):
+async def test_refresh_token_double_use(client, logged_in_tokens):
     """Refresh token cannot be used more than once (reuse is blocked)."""
-    email = f"doubleuse_{uuid.uuid4()}@example.com"
-    password = "doublepass"
-    await client.post("/api/v1/users/", json={"email": email, "password": password})
-    login_res = await client.post("/api/v1/token", data={"username": email, "password": password})
-    refresh_token = login_res.json()["refresh_token"]
+    refresh_token = logged_in_tokens["refresh"]
 
     # First use should succeed
     res1 = await client.post("/api/v1/refresh", json={"refresh_token": refresh_token})
@@ -177,11 +233,11 @@ async def test_refresh_token_double_use(client):
 
 
 @pytest.mark.asyncio
-async def test_refresh_token_for_another_user(client):
+async def test_refresh_token_for_another_user(client, unique_email):
     """Refresh token cannot be used by another user (cross-user misuse)."""
     # Register two users
-    email1 = f"user1_{uuid.uuid4()}@example.com"
-    email2 = f"user2_{uuid.uuid4()}@example.com"
+    email1 = unique_email()
+    email2 = unique_email()
     password = "testpass"
     await client.post("/api/v1/users/", json={"email": email1, "password": password})
     await client.post("/api/v1/users/", json={"email": email2, "password": password})
@@ -199,46 +255,12 @@ async def test_refresh_token_for_another_user(client):
     assert res.status_code == 200 or res.status_code == 401  # Acceptable: depends on implementation
 
 @pytest.mark.asyncio
-async def test_refresh_token_revoked_after_logout(client):
-    """Refresh token is revoked after logout and cannot be reused."""
-    email = f"logoutrevoked_{uuid.uuid4()}@example.com"
-    password = "logoutpass"
-    await client.post("/api/v1/users/", json={"email": email, "password": password})
-    login_res = await client.post("/api/v1/token", data={"username": email, "password": password})
-    tokens = login_res.json()
-    access_token = tokens["access_token"]
-    refresh_token = tokens["refresh_token"]
-
-    # Logout
-    logout_res = await client.post("/api/v1/logout", headers={"Authorization": f"Bearer {access_token}"})
-    assert logout_res.status_code == 204
-
-    # Try to use refresh token after logout
-    refresh_res = await client.post("/api/v1/refresh", json={"refresh_token": refresh_token})
-    assert refresh_res.status_code == 401
-    assert refresh_res.json().get("detail") == "Refresh token invalid or reused"
-
-
-@pytest.mark.asyncio
-async def test_refresh_token_contains_iat_claim(client):
+async def test_refresh_token_contains_iat_claim(logged_in_tokens):
     """Refresh token payload contains 'iat' (issued at) claim."""
-    email = f"iatuser_{uuid.uuid4()}@example.com"
-    password = "iatpass"
+    refresh_token = logged_in_tokens["refresh"]
 
-    # Register user
-    await client.post("/api/v1/users/", json={"email": email, "password": password})
-
-    # Login and get refresh token
-    login_res = await client.post("/api/v1/token", data={"username": email, "password": password})
-    refresh_token = login_res.json()["refresh_token"]
-
-    # Decode refresh token without verifying expiration (ignore exp for test)
-    payload = jwt.decode(
-        refresh_token,
-        settings.secret_key,
-        algorithms=[settings.algorithm],
-        options={"verify_exp": False}
-    )
+    # Only the claims are inspected, so skip the signature check
+    payload = jwt.decode(refresh_token, options={"verify_signature": False})
 
     assert "iat" in payload
     assert isinstance(payload["iat"], int)
@@ -246,29 +268,16 @@ async def test_refresh_token_contains_iat_claim(client):
 
 
 @pytest.mark.asyncio
-async def test_refresh_token_reuse_blocked(client):
+async def test_refresh_token_reuse_blocked(client, logged_in_tokens):
     """Each refresh token can only be used once; reuse is blocked."""
-    email = f"user_{uuid.uuid4()}@example.com"
-    password = "testpassword"
-    
-    # Register new user
-    res_register = await client.post("/api/v1/users/", json={"email": email, "password": password})
-    assert res_register.status_code == 200
-    
-    # Login to get initial tokens
-    login_res = await client.post("/api/v1/token", data={"username": email, "password": password})
-    assert login_res.status_code == 200
-    tokens = login_res.json()
-    refresh_token_1 = tokens["refresh_token"]
-    print("refresh_token_1:", refresh_token_1)
+    refresh_token_1 = logged_in_tokens["refresh"]
 
     # Use refresh token to get new tokens (first refresh)
     refresh_res_1 = await client.post("/api/v1/refresh", json={"refresh_token": refresh_token_1})
     assert refresh_res_1.status_code == 200
     refresh_token_2 = refresh_res_1.json()["refresh_token"]
-    print("refresh_token_2:", refresh_token_2)
-
-    await asyncio.sleep(0.1)
+    # Every refresh token carries its own jti, so rotation never reissues the same token
+    assert refresh_token_2 != refresh_token_1
 
     # Using old refresh token again should fail (reuse detected)
     refresh_res_reuse = await client.post("/api/v1/refresh", json={"refresh_token": refresh_token_1})
@@ -276,13 +285,9 @@ async def test_refresh_token_reuse_blocked(client):
 
     # Use second refresh token to get new tokens (second refresh)
     refresh_res_2 = await client.post("/api/v1/refresh", json={"refresh_token": refresh_token_2})
-    print("refresh_res_2.status_code:", refresh_res_2.status_code)
-    print("refresh_res_2.json():", refresh_res_2.json())
     assert refresh_res_2.status_code == 200
     refresh_token_3 = refresh_res_2.json()["refresh_token"]
-    print("refresh_token_3:", refresh_token_3)
-
-    await asyncio.sleep(0.1)
+    assert refresh_token_3 != refresh_token_2
 
     # Using second refresh token again should fail (reuse detected)
     refresh_res_reuse2 = await client.post("/api/v1/refresh", json={"refresh_token": refresh_token_2})
@@ -290,29 +295,13 @@ async def test_refresh_token_reuse_blocked(client):
 
     # The latest refresh token should still work (third refresh)
     refresh_res_3 = await client.post("/api/v1/refresh", json={"refresh_token": refresh_token_3})
-    print("refresh_res_3.status_code:", refresh_res_3.status_code)
-    print("refresh_res_3.json():", refresh_res_3.json())
     assert refresh_res_3.status_code == 200
 
 
 @pytest.mark.asyncio
-async def test_access_token_tampering(client):
+async def test_access_token_tampering(client, logged_in_tokens, tampered_token_factory):
     """Tampered access tokens are rejected by protected endpoints."""
-    email = f"tampertest_{uuid.uuid4()}@example.com"
-    password = "tamperpass"
-    await client.post("/api/v1/users/", json={"email": email, "password": password})
-    login_res = await client.post("/api/v1/token", data={"username": email, "password": password})
-    access_token = login_res.cookies.get("access_token")
-
-    # Tamper with the payload (change a character)
-    parts = access_token.split('.')
-    assert len(parts) == 3
-    import base64, json
-    payload_bytes = base64.urlsafe_b64decode(parts[1] + '==')
-    payload = json.loads(payload_bytes)
-    payload["sub"] = "hacker@example.com"
-    new_payload = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
-    tampered_token = f"{parts[0]}.{new_payload}.{parts[2]}"
+    tampered_token = tampered_token_factory(logged_in_tokens["access"])
 
     # Use the tampered token as a cookie
     client.cookies.set("access_token", tampered_token)
@@ -320,75 +309,159 @@ async def test_access_token_tampering(client):
     assert res.status_code == 401 or res.status_code == 403
 
 @pytest.mark.asyncio
-async def test_metrics_user_registration(client):
-    """Register a user and check registration metric increments."""
-    email = f"metricsuser_{uuid.uuid4()}@example.com"
-    # Register user
-    res = await client.post("/api/v1/users/", json={"email": email, "password": "testpassword"})
-    assert res.status_code in (200, 201)
-    # Fetch metrics
-    metrics_res = await client.get("/metrics")
-    assert metrics_res.status_code == 200
-    # Check registration metric is present and incremented
-    assert re.search(r'app_user_registrations_total\{method="password"\} [1-9][0-9]*\.0', metrics_res.text)
+async def test_admin_list_users(client, db_session, unique_email):
+    """Admin user listing returns every user with the public fields."""
+    from sqlalchemy import text
+    admin_email = unique_email()
+    other_email = unique_email()
+    await client.post("/api/v1/users/", json={"email": admin_email, "password": "adminpass"})
+    await client.post("/api/v1/users/", json={"email": other_email, "password": "otherpass"})
+    await db_session.execute(
+        text("UPDATE users SET role = 'admin' WHERE email = :email"), {"email": admin_email}
+    )
+    await db_session.commit()
+
+    login_res = await client.post("/api/v1/token", data={"username": admin_email, "password": "adminpass"})
+    client.cookies.set("access_token", login_res.cookies.get("access_token"))
+    res = await client.get("/api/v1/admin/users")
+    assert res.status_code == 200
+    users = {u["email"]: u for u in res.json()}
+    assert set(users) == {admin_email, other_email}
+    assert users[admin_email]["role"] == "admin"
+    assert users[other_email]["role"] == "user"
+    assert "hashed_password" not in users[other_email]
 
 @pytest.mark.asyncio
-async def test_metrics_user_login(client):
-    """Login a user and check login metric increments."""
-    email = f"metricslogin_{uuid.uuid4()}@example.com"
-    # Register user
-    await client.post("/api/v1/users/", json={"email": email, "password": "testpassword"})
-    # Login user
-    res = await client.post("/api/v1/token", data={"username": email, "password": "testpassword"})
+async def test_admin_update_user_role(client, db_session, unique_email):
+    """Admin can change a user's role; unknown users and invalid roles are rejected."""
+    from sqlalchemy import text
+    admin_email = unique_email()
+    other_email = unique_email()
+    await client.post("/api/v1/users/", json={"email": admin_email, "password": "adminpass"})
+    other_res = await client.post("/api/v1/users/", json={"email": other_email, "password": "otherpass"})
+    other_id = other_res.json()["id"]
+    await db_session.execute(
+        text("UPDATE users SET role = 'admin' WHERE email = :email"), {"email": admin_email}
+    )
+    await db_session.commit()
+
+    login_res = await client.post("/api/v1/token", data={"username": admin_email, "password": "adminpass"})
+    client.cookies.set("access_token", login_res.cookies.get("access_token"))
+    res = await client.patch(f"/api/v1/admin/users/{other_id}/role", json={"role": "admin"})
     assert res.status_code == 200
-    # Fetch metrics
-    metrics_res = await client.get("/metrics")
-    assert metrics_res.status_code == 200
-    # Check login metric is present and incremented
-    assert re.search(r'app_user_logins_total\{method="password"\} [1-9][0-9]*\.0', metrics_res.text)
+    assert res.json()["email"] == other_email
+    assert res.json()["role"] == "admin"
+
+    res = await client.patch(f"/api/v1/admin/users/{other_id}/role", json={"role": "superuser"})
+    assert res.status_code == 400
+    res = await client.patch("/api/v1/admin/users/999999/role", json={"role": "user"})
+    assert res.status_code == 404
+    # An unknown user is reported before an invalid role
+    res = await client.patch("/api/v1/admin/users/999999/role", json={"role": "superuser"})
+    assert res.status_code == 404
+
+@pytest.mark.asyncio
+async def test_role_change_applies_immediately(client, db_session, unique_email):
+    """A role change is seen on the user's next request despite the user cache."""
+    from sqlalchemy import text
+    admin_email = unique_email()
+    other_email = unique_email()
+    await client.post("/api/v1/users/", json={"email": admin_email, "password": "adminpass"})
+    other_res = await client.post("/api/v1/users/", json={"email": other_email, "password": "otherpass"})
+    other_id = other_res.json()["id"]
+    await db_session.execute(
+        text("UPDATE users SET role = 'admin' WHERE email = :email"), {"email": admin_email}
+    )
+    await db_session.commit()
+    admin_login = await client.post("/api/v1/token", data={"username": admin_email, "password": "adminpass"})
+    other_login = await client.post("/api/v1/token", data={"username": other_email, "password": "otherpass"})
+    admin_token = admin_login.cookies.get("access_token")
+    other_token = other_login.cookies.get("access_token")
+
+    client.cookies.set("access_token", other_token)
+    assert (await client.get("/api/v1/admin-only")).status_code == 403
+
+    client.cookies.set("access_token", admin_token)
+    res = await client.patch(f"/api/v1/admin/users/{other_id}/role", json={"role": "admin"})
+    assert res.status_code == 200
+
+    client.cookies.set("access_token", other_token)
+    assert (await client.get("/api/v1/admin-only")).status_code == 200
+
+@pytest.mark.asyncio
+async def test_admin_delete_boardtest_users(client, db_session, unique_email):
+    """Admin bulk delete removes only @boardtests.com users."""
+    from sqlalchemy import text
+    admin_email = unique_email()
+    board_email = unique_email("boardtests.com")
+    await client.post("/api/v1/users/", json={"email": admin_email, "password": "adminpass"})
+    await client.post("/api/v1/users/", json={"email": board_email, "password": "boardpass"})
+    await db_session.execute(
+        text("UPDATE users SET role = 'admin' WHERE email = :email"), {"email": admin_email}
+    )
+    await db_session.commit()
+
+    login_res = await client.post("/api/v1/token", data={"username": admin_email, "password": "adminpass"})
+    client.cookies.set("access_token", login_res.cookies.get("access_token"))
+    res = await client.delete("/api/v1/admin/delete-boardtest-users")
+    assert res.status_code == 200
+    res = await client.get("/api/v1/admin/users")
+    assert [u["email"] for u in res.json()] == [admin_email]
 
 @pytest.mark.asyncio
-async def test_metrics_refresh_token_usage(client):
-    """Use refresh token and check refresh token usage metric increments."""
-    email = f"metricsrefresh_{uuid.uuid4()}@example.com"
-    # Register user
-    await client.post("/api/v1/users/", json={"email": email, "password": "testpassword"})
-    # Login user to get tokens
-    login_res = await client.post("/api/v1/token", data={"username": email, "password": "testpassword"})
+async def test_metrics_counters_increment(client, unique_email):
+    """Registration, login and refresh each increment their counter, checked in one scrape."""
+    email = unique_email()
+    password = "testpassword"
+    res = await client.post("/api/v1/users/", json={"email": email, "password": password})
+    assert res.status_code in (200, 201)
+    login_res = await client.post("/api/v1/token", data={"username": email, "password": password})
     assert login_res.status_code == 200
-    refresh_token = login_res.json()["refresh_token"]
-    # Use refresh token
-    refresh_res = await client.post("/api/v1/refresh", json={"refresh_token": refresh_token})
+    refresh_res = await client.post("/api/v1/refresh", json={"refresh_token": login_res.json()["refresh_token"]})
     assert refresh_res.status_code == 200
-    # Fetch metrics
+    # Fetch metrics once for all three counters
     metrics_res = await client.get("/metrics")
     assert metrics_res.status_code == 200
-    # Check refresh token usage metric is present and incremented
-    assert re.search(r'app_refresh_token_usage_total\{method="refresh"\} [1-9][0-9]*\.0', metrics_res.text)
+    assert _REGISTRATIONS_RE.search(metrics_res.text)
+    assert _LOGINS_RE.search(metrics_res.text)
+    assert _REFRESHES_RE.search(metrics_res.text)
 
 @pytest.mark.asyncio
 async def test_logging_middleware(client, caplog):
-    """Test that request/response logs are emitted for an endpoint."""
+    """Test that a single completion log with method, path and status is emitted per request."""
     with caplog.at_level(logging.INFO, logger="auth"):
         await client.get("/api/v1/health")
-    # Check that both request_start and request_end events are logged
-    assert any("request_start" in record.getMessage() for record in caplog.records)
-    assert any("request_end" in record.getMessage() for record in caplog.records)
+    # Only the completion line is logged, carrying method, path, status and duration
+    messages = (record.getMessage() for record in caplog.records)
+    request_logs = [message for message in messages if message.startswith("req ")]
+    assert len(request_logs) == 1
+    assert re.fullmatch(r"req GET /api/v1/health \d{3} \d+\.\d{3}ms", request_logs[0])
 
 @pytest.mark.asyncio
-async def test_tracing_span_created(client):
-    """Test that a tracing span is created for a request."""
-    # Get the global tracer provider (already set by the app)
-    provider = cast(TracerProvider, trace.get_tracer_provider())
-    exporter = InMemorySpanExporter()
-    processor = SimpleSpanProcessor(exporter)
-    provider.add_span_processor(processor)
+async def test_logging_middleware_logs_failed_request(caplog):
+    """A request whose handler raises is still logged, with status 500."""
+    from app.main import LogRequestsMiddleware
 
+    async def failing_app(scope, receive, send):
+        raise RuntimeError("boom")
+
+    middleware = LogRequestsMiddleware(failing_app)
+    scope = {"type": "http", "method": "GET", "path": "/boom"}
+    with caplog.at_level(logging.INFO, logger="auth"):
+        with pytest.raises(RuntimeError):
+            await middleware(scope, None, None)
+    request_logs = [r.getMessage() for r in caplog.records if r.getMessage().startswith("req ")]
+    assert len(request_logs) == 1
+    assert re.fullmatch(r"req GET /boom 500 \d+\.\d{3}ms", request_logs[0])
+
+@pytest.mark.asyncio
+async def test_tracing_span_created(client, span_exporter):
+    """Test that a tracing span is created for a request."""
     # Make a request
     await client.get("/api/v1/health")
 
     # Check that at least one span was exported
-    spans = exporter.get_finished_spans()
+    spans = span_exporter.get_finished_spans()
     assert len(spans) > 0
     # Optionally, check span names
     assert any("/api/v1/health" in span.name for span in spans)